@@ -0,0 +1,239 @@
+import argparse
+import random
+import string
+import time
+import tracemalloc
+from pathlib import Path
+
+import dynamic
+import generator
+import static
+
+from model import register
+from tools import parse_utils
+
+
+def measure_time(func, repeat: int) -> float:
+    'returns the fastest of `repeat` runs of `func` in seconds'
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        duration = time.perf_counter() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+
+# Tables of the single pass tokenizers the `str.replace` chains of `parse_utils` are compared to
+OBJDUMP_TABLE = str.maketrans('\t(,:){}', '       ')
+SPIKE_TABLE = str.maketrans('\t(,:)', '     ')
+
+
+def translate_objdump_line(source_line: str) -> list[str]:
+    'tokenizes a line of llvm-objdump output like `parse_utils.split_objdump_tokens` with one `str.translate`'
+    return source_line.strip().replace('    ', ' ~ ').translate(OBJDUMP_TABLE).split()
+
+
+def translate_spike_line(source_line: str) -> list[str]:
+    'tokenizes a line of spike trace like `parse_utils.split_spike_line` with one `str.translate`'
+    return source_line[10:].translate(SPIKE_TABLE).split()
+
+
+def compare_tokenizers(lines: list[str], chained, translated, repeat: int):
+    '''
+    Measures the replace chain `chained` and the `str.translate` tokenizer `translated` on `lines`
+    and counts the lines they tokenize differently.
+    '''
+    mismatches = sum(1 for line in lines if chained(line) != translated(line))
+    for name, tokenize in [('Replace chain:', chained), ('Translate:    ', translated)]:
+        duration = measure_time(lambda: [tokenize(line) for line in lines], repeat)
+        print(name, round(duration * 1000, 2), 'ms,', round(len(lines) / max(duration, 1e-9) / 1e6, 3), 'M lines per second')
+    print('Mismatches:   ', mismatches)
+
+
+def measure_memory(func) -> tuple[object, int]:
+    'returns the result of `func` and the bytes allocated by it that are still alive'
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def bench_model(fqfn: str, repeat: int):
+    '''
+    Measures the memory and the construction time of the instructions of the disassembly `fqfn`.
+    '''
+    ign = {'mnemonic': generator.ignore}
+    parse = lambda: parse_utils.parse_file(fqfn, static.parse_line, ign)
+
+    program, size = measure_memory(parse)
+    inst_count = len(program.instructions)
+    duration = measure_time(parse, repeat)
+
+    print('Instructions:', inst_count)
+    print('Memory:      ', size, 'bytes,', round(size / max(inst_count, 1), 1), 'bytes per instruction')
+    print('Parse time:  ', round(duration * 1000, 2), 'ms,', round(duration * 1e9 / max(inst_count, 1), 1), 'ns per instruction')
+
+
+def bench_regs(fqfn: str, repeat: int):
+    '''
+    Measures the throughput of `Regs.get_reg` for the operands of the spike trace `fqfn`.
+    '''
+    operands = [
+        operand
+        for source_line in parse_utils.iter_lines(fqfn)
+        if source_line[0:12] == 'core   0: 0x'
+        for operand in parse_utils.split_spike_line(source_line)[3:]
+    ]
+    regs = register.Regs()
+
+    def resolve():
+        for operand in operands:
+            regs.get_reg(operand)
+
+    duration = measure_time(resolve, repeat)
+    print('Operands:  ', len(operands))
+    print('Resolve time:', round(duration * 1000, 2), 'ms,', round(len(operands) / max(duration, 1e-9) / 1e6, 2), 'M operands per second')
+
+
+def bench_objdump(fqfn: str, repeat: int):
+    '''
+    Measures the throughput of `static.parse_line` for the lines of the disassembly `fqfn`
+    and compares its tokenizer to a `str.translate` one.
+    '''
+    lines = list(parse_utils.iter_lines(fqfn))
+    ign = {'mnemonic': generator.ignore}
+
+    def parse():
+        for source_line in lines:
+            static.parse_line(source_line, ign)
+
+    duration = measure_time(parse, repeat)
+    print('Lines:     ', len(lines))
+    print('Parse time:', round(duration * 1000, 2), 'ms,', round(len(lines) / max(duration, 1e-9) / 1e6, 3), 'M lines per second')
+
+    inst_lines = [
+        source_line for source_line in lines
+        if source_line.strip() and (source_line[0:1] == ' ' or source_line[0:1] in string.hexdigits)
+    ]
+    compare_tokenizers(inst_lines, parse_utils.split_objdump_tokens, translate_objdump_line, repeat)
+
+
+def bench_spike(fqfn: str, repeat: int):
+    '''
+    Measures the throughput of `dynamic.parse_spike_line` for the lines of the spike trace `fqfn`
+    and compares its tokenizer to a `str.translate` one.
+    '''
+    lines = list(parse_utils.iter_lines(fqfn))
+    ign = {'mnemonic': generator.ignore, 'opcode': 0x80000000}
+
+    def parse():
+        for source_line in lines:
+            dynamic.parse_spike_line(source_line, ign)
+
+    duration = measure_time(parse, repeat)
+    print('Lines:     ', len(lines))
+    print('Parse time:', round(duration * 1000, 2), 'ms,', round(len(lines) / max(duration, 1e-9) / 1e6, 3), 'M lines per second')
+
+    inst_lines = [source_line for source_line in lines if source_line[0:12] == 'core   0: 0x']
+    compare_tokenizers(inst_lines, parse_utils.split_spike_line, translate_spike_line, repeat)
+
+
+def bench_generator(fqfn: str, repeat: int):
+    '''
+    Measures the generation, merge and selection of the instructions for the disassembly `fqfn`.
+    '''
+    ign = {
+        'mnemonic': generator.ignore,
+        'opcode': 0x80000000
+    }
+    instructions = parse_utils.parse_file(fqfn, static.parse_line, ign).instructions
+    op_len = generator.BASE_OP_LEN + generator.CUST_OP_LEN
+    print('Instructions:', len(instructions))
+    for width in [generator.BitWitdth.FULL, generator.BitWitdth.EXTENDED]:
+        gen = lambda: generator.greedy_inst_gen(instructions, width, op_len, ignore_mem=True, one_imm=True)
+        pats = gen()
+        merged = generator.merge_patterns(pats)
+        select = lambda: generator.select_insts(instructions, merged, [], generator.get_size_improvement, width)
+        print(' ', width.value, 'bit')
+        print('    Generation time:', round(measure_time(gen, repeat) * 1000, 2), 'ms')
+        print('    Merge time:     ', round(measure_time(lambda: generator.merge_patterns(pats), repeat) * 1000, 2), 'ms')
+        print('    Selection time: ', round(measure_time(select, repeat) * 1000, 2), 'ms')
+
+
+def get_synthetic_patterns(count: int, seed: int=0) -> set:
+    'returns `count` random candidate patterns like `generator.greedy_inst_gen` proposes them'
+    rand = random.Random(seed)
+    mnemonics = ['add', 'addi', 'and', 'andi', 'or', 'ori', 'xor', 'xori', 'sub', 'mul', 'slli', 'srli', 'srai', 'lui']
+    regs = register.Regs().get_all()
+    pats = set()
+    for _ in range(count):
+        imm_widths = [rand.randint(1, 12) for _ in range(rand.randint(0, 2))]
+        pat = generator.InstFusion(generator.Format(generator.BitWitdth.EXTENDED, generator.BASE_OP_LEN + generator.CUST_OP_LEN, imm_widths))
+        pat.template = [rand.choice(mnemonics) for _ in range(rand.randint(2, 5))]
+        pat.in_regs = rand.sample(regs, rand.randint(1, 4))
+        pat.out_regs = [rand.choice(regs)]
+        pat.t_in_reg = len(pat.in_regs)
+        pat.t_out_reg = len(pat.out_regs)
+        pats.add(pat)
+    return pats
+
+
+def bench_merge(count: int, repeat: int):
+    '''
+    Measures `generator.merge_patterns` for `count` synthetic candidate patterns.
+    '''
+    pats = get_synthetic_patterns(count)
+    merged = generator.merge_patterns(pats)
+    duration = measure_time(lambda: generator.merge_patterns(pats), repeat)
+    print('Patterns:  ', len(pats), 'merged to', len(merged))
+    print('Merge time:', round(duration * 1000, 2), 'ms,', round(duration * 1e9 / max(len(pats), 1), 1), 'ns per pattern')
+
+
+def main(args):
+    """
+    Main function to run a benchmark on a set of files.
+
+    Args:
+        args (argparse.Namespace): The command-line arguments passed to the script.
+                                - benchmark: The benchmark to run.
+                                - path: The base path where the files are located.
+                                - files: An iterable with the names of the files.
+                                - repeat: The count of timed runs, the fastest is reported.
+                                - patterns: The counts of synthetic patterns of the merge benchmark.
+
+    """
+    if args.benchmark == 'merge':
+        for count in args.patterns:
+            print('Benchmark', args.benchmark, 'on', count, 'patterns')
+            bench_merge(count, args.repeat)
+        return
+
+    path = Path(args.path).absolute()
+    for file in args.files:
+        fqpn = '{}/{}'.format(str(path), str(file))
+        print('Benchmark', args.benchmark, 'on', file)
+        if args.benchmark == 'model':
+            bench_model(fqpn, args.repeat)
+        elif args.benchmark == 'regs':
+            bench_regs(fqpn, args.repeat)
+        elif args.benchmark == 'objdump':
+            bench_objdump(fqpn, args.repeat)
+        elif args.benchmark == 'spike':
+            bench_spike(fqpn, args.repeat)
+        elif args.benchmark == 'generator':
+            bench_generator(fqpn, args.repeat)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the parsers and models.')
+    parser.add_argument('benchmark', type=str, choices=['model', 'regs', 'objdump', 'spike', 'generator', 'merge'], help='benchmark to run')
+    parser.add_argument('files', metavar='F', type=str, nargs='*', help='files to benchmark')
+    parser.add_argument('--path', type=str, help='base path for the files')
+    parser.add_argument('--repeat', type=int, default=5, help='count of timed runs')
+    parser.add_argument('--patterns', type=int, nargs='+', default=[10000, 100000, 1000000], help='counts of synthetic patterns to merge')
+
+    main(parser.parse_intermixed_args())
@@ -4,6 +4,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import tikzplotlib
 
+from tools import ranking
+
 plt.rcParams["font.family"] = "cmb10"
 debug = False
 
@@ -15,11 +17,7 @@ def clear_db(client):
 
 
 def sort_dict(result, threshold=0):
-    vals = [
-        val 
-        for val in result.items()
-    ]
-    return sorted(vals, key=lambda x:x[1], reverse=True)[:threshold]
+    return ranking.top_k(result.items(), threshold, key=lambda x:x[1])
 
 
 def plot_bars(stats, name: str, tex: bool=False):
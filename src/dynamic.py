@@ -1,13 +1,14 @@
 import argparse
+from functools import partial
 from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
-from model import instruction_model, program
+from model import columnar, instruction_model, program
 import string
 
 import generator
 
-from tools import parse_utils, evaluator, modes, plotter
+from tools import analysis, coverage, parse_utils, evaluator, histogram, modes, plotter
 
 plt.rcParams["font.family"] = "cmb10"
 
@@ -116,40 +117,67 @@ def parse_spike_line(source_line: str, ignore) -> instruction_model.Instruction:
     - The global `instruction_model` with an `Instruction` class should be available
       in the context where this function is executed.
     '''
-    if source_line[0:12] == 'core   0: 0x':
-        elems: list[str] = source_line[10:].strip() \
-            .replace(')', '') \
-            .replace('(', ' ') \
-            .replace('\t', ' ') \
-            .replace(' - ', '-') \
-            .replace(' + ', '+') \
-            .replace('  ', ' ') \
-            .replace('  ', ' ') \
-            .replace('  ', ' ') \
-            .replace(',', '') \
-            .replace(':', '') \
-            .split(' ')
-        elen = len(elems)
-        if elen >= 3:
-            mnemonic = elems[2]
-            if mnemonic in ignore['mnemonic']:
-                return None
-            opcode = elems[1]
-            if int(opcode, 16) & ignore['opcode'] > 0:
-                return None
-            instruction = instruction_model.Instruction(
-                address=elems[0], 
-                opcode=opcode, 
-                mnemonic=mnemonic
-            )
-
-            for elem in elems[3:]:
-                instruction.append_param(elem)
-            
-            return instruction
+    elems = parse_utils.decode_spike_line(source_line)
+    if elems is not None:
+        address, opcode, mnemonic, params = elems
+        if mnemonic in ignore['mnemonic']:
+            return None
+        if int(opcode, 16) & ignore['opcode'] > 0:
+            return None
+        instruction = instruction_model.Instruction(
+            address=address, 
+            opcode=opcode, 
+            mnemonic=mnemonic
+        )
+        instruction.append_params(params)
+        
+        return instruction
     return None
 
 
+def analyze_chunked(files, path, parser, ign, chunks, jobs=1, coverage_csv=None):
+    """
+    Analyzes the traces like `main`, but splits each trace into `chunks` parts that are
+    parsed in a pool of `jobs` processes into histograms, which are merged afterwards.
+
+    The instructions are never collected, so the memory depends on the count of distinct
+    mnemonics, opcodes, registers and addresses instead of the trace length.
+    With one chunk and one job each trace is streamed through a histogram in this process.
+    """
+    tp = 'Dynamic'
+    total = histogram.Histogram()
+    fqpns = [
+        '{}/{}'.format(str(path), str(file))
+        for file in files
+    ]
+    hists = histogram.from_files(fqpns, parser, ign, chunks, jobs)
+    for file, hist in zip(files, hists):
+        if debug:
+            print('Base Path: ', path)
+            print('File to analyze: ', file)
+
+        evaluator.print_individual_histogram_improvement(file, hist)
+        total.merge(hist)
+
+    evaluator.print_total_histogram_improvement(total)
+    if coverage_csv:
+        curve = coverage.get_curve(total.addrs.values(), total.inst_count, range(1, 101))
+        coverage.write_csv(coverage_csv, curve, total.inst_count)
+
+    for mode in modes.Mode:
+        stats = total.most_inst(mode, modes.SearchKey.MNEMONIC, 10)
+        plotter.plot_bars(stats, '_Total', tp, path, mode, modes.SearchKey.MNEMONIC, True)
+
+    stats = total.most_inst(modes.Mode.ALL, modes.SearchKey.OPCODE, 10)
+    plotter.plot_bars(stats, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.OPCODE, True)
+
+    stats = total.most_inst(modes.Mode.ALL, modes.SearchKey.REGISTER, 10)
+    plotter.plot_bars(stats, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.REGISTER, True)
+
+    pairs = total.most_pairs(10, equal=False, connected=True)
+    plotter.plot_bars(pairs, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.PAIR, True)
+
+
 def main(args):
     """
     The main entry point for the script that processes and analyzes files.
@@ -162,6 +190,11 @@ def main(args):
                                 It must have at least the following attributes:
                                 - path: The base path where the traces are located.
                                 - files: An iterable with the names of the traces to be processed.
+                                - jobs: The count of traces parsed in parallel.
+                                - chunks: The count of parts of one trace parsed in parallel.
+                                - columnar: Store the instructions in columns instead of objects.
+                                - online: Count the instructions while parsing instead of collecting them.
+                                - coverage: The CSV file to write the coverage curve of the total to.
 
     """
     ign = {
@@ -176,38 +209,73 @@ def main(args):
     if use_etiss: 
         parser = parse_etiss_line
     
+    if args.online or args.chunks > 1:
+        # the parts of one trace are parsed in parallel even with a single job
+        jobs = max(args.jobs, args.chunks)
+        analyze_chunked(args.files, path, parser, ign, args.chunks, jobs, args.coverage)
+        return
+    
     tp = 'Dynamic'
-    total = []
-    for file in args.files:
+    parts = []
+    fqpns = [
+        '{}/{}'.format(str(path), str(file))
+        for file in args.files
+    ]
+    parse = parse_utils.parse_file
+    if args.columnar:
+        parse = parse_utils.parse_columnar
+    programs = parse_utils.map_files(partial(parse, parse_line=parser, ignore=ign), fqpns, args.jobs)
+    for file, program in zip(args.files, programs):
         if debug:
             print('Base Path: ', path)
             print('File to analyze: ', file)
 
-
-       
-        fqpn = '{}/{}'.format(str(path), str(file))
-        program = parse_utils.parse_file(fqpn, parser, ign)
         instructions = program.instructions
         if debug:
             for inst in instructions:
                 print(inst)
-        total += instructions
+        parts.append(instructions)
         
         if plot_all:
             evaluator.plot_individual_dynamic_stats(file, instructions, tp, path)
-        evaluator.print_individual_dynamic_improvement(file, instructions)
-
-    evaluator.print_total_dynamic_improvement(total)
-
-    for mode in modes.Mode:
-        stats = evaluator.most_inst(total, mode, modes.SearchKey.MNEMONIC, 10)
-        plotter.plot_bars(stats, '_Total', tp, path, mode, modes.SearchKey.MNEMONIC, True)
-
-    stats = evaluator.most_inst(total, modes.Mode.ALL, modes.SearchKey.OPCODE, 10)
-    plotter.plot_bars(stats, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.OPCODE, True)
-
-    stats = evaluator.most_inst(total, modes.Mode.ALL, modes.SearchKey.REGISTER, 10)
-    plotter.plot_bars(stats, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.REGISTER, True)
+        stats = analysis.MostInst(modes.Mode.FULL, modes.SearchKey.MNEMONIC, 10000000)
+        addrs = analysis.MostAddr(10000000)
+        byte_count = analysis.ByteCount()
+        analysis.run(instructions, [stats, addrs, byte_count])
+        evaluator.report_individual_dynamic_improvement(file, stats.result(), len(instructions), byte_count.result(), addrs.counts.values())
+        if evaluator.debug:
+            evaluator.print_debug_pairs(instructions)
+
+    if args.columnar:
+        total = columnar.ColumnarProgram.concat(parts)
+    else:
+        total = [inst for instructions in parts for inst in instructions]
+    # all statistics of the total are computed in one traversal
+    full_stats = analysis.MostInst(modes.Mode.FULL, modes.SearchKey.MNEMONIC, 10000000000)
+    addrs = analysis.MostAddr(10000000)
+    byte_count = analysis.ByteCount()
+    mode_stats = [
+        analysis.MostInst(mode, modes.SearchKey.MNEMONIC, 10)
+        for mode in modes.Mode
+    ]
+    opcode_stats = analysis.MostInst(modes.Mode.ALL, modes.SearchKey.OPCODE, 10)
+    register_stats = analysis.MostInst(modes.Mode.ALL, modes.SearchKey.REGISTER, 10)
+    pairs = analysis.MostPairs(10, equal=False, connected=True)
+    analysis.run(total, mode_stats + [full_stats, addrs, byte_count, opcode_stats, register_stats, pairs])
+
+    evaluator.report_total_dynamic_improvement(full_stats.result(), len(total), byte_count.result(), addrs.counts.values())
+    if args.coverage:
+        curve = coverage.get_curve(addrs.counts.values(), len(total), range(1, 101))
+        coverage.write_csv(args.coverage, curve, len(total))
+    if evaluator.debug:
+        evaluator.print_debug_pairs(total)
+
+    for mode, stats in zip(modes.Mode, mode_stats):
+        plotter.plot_bars(stats.result(), '_Total', tp, path, mode, modes.SearchKey.MNEMONIC, True)
+
+    plotter.plot_bars(opcode_stats.result(), '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.OPCODE, True)
+
+    plotter.plot_bars(register_stats.result(), '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.REGISTER, True)
     
     # chains = evaluator.longest_chains(total, 10)
     # plotter.plot_bars(chains, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.CHAIN, True)
@@ -218,9 +286,7 @@ def main(args):
     # lw_dist = evaluator.inst_vals(total, 'lw', 10)
     # plotter.plot_bars(lw_dist, '_Total_LW', tp, path, modes.Mode.FULL, modes.SearchKey.IMM)
 
-    pairs = evaluator.most_pairs(total, 10, equal=False, connected=True)
-    plotter.plot_bars(pairs, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.PAIR, True)
-
+    plotter.plot_bars(pairs.result(), '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.PAIR, True)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Count the instructions in an trace file.')
@@ -228,6 +294,11 @@ if __name__ == '__main__':
     parser.add_argument('--path', type=str, help='base path for the files')
     parser.add_argument('--spike', type=bool, default=True, required=False, help='Use the Spike trace file parser')
     parser.add_argument('--etiss', type=bool, default=False, required=False, help='Use the ETISS trace file parser')
+    parser.add_argument('--jobs', type=int, default=1, required=False, help='count of traces parsed in parallel')
+    parser.add_argument('--chunks', type=int, default=1, required=False, help='count of parts of each trace parsed in parallel')
+    parser.add_argument('--columnar', type=bool, default=False, required=False, help='Store the instructions in columns instead of objects')
+    parser.add_argument('--online', type=bool, default=False, required=False, help='Count the instructions while parsing instead of collecting them')
+    parser.add_argument('--coverage', type=str, default=None, required=False, help='CSV file to write the instructions that make up 1 to 100 %% of the total time to')
 
 
     main(parser.parse_args())
@@ -8,7 +8,7 @@ from enum import Enum
 import static
 import dynamic
 import generator
-from tools import parse_utils, evaluator
+from tools import cache, parse_utils, evaluator
 from model import register, instruction_model, immediate
 
 
@@ -33,84 +33,40 @@ def eval_etiss_line(source_line: str, ignore, count: bool) -> int:
 
 
 def eval_spike_line(source_line: str, ignore, count: bool) -> int:
-    if source_line[0:12] == 'core   0: 0x':
-        elems: list[str] = source_line[10:].strip() \
-            .replace(')', '') \
-            .replace('(', ' ') \
-            .replace('\t', ' ') \
-            .replace(' - ', '-') \
-            .replace(' + ', '+') \
-            .replace('  ', ' ') \
-            .replace('  ', ' ') \
-            .replace('  ', ' ') \
-            .replace(',', '') \
-            .replace(':', '') \
-            .split(' ')
-        elen = len(elems)
-        if elen >= 3:
-            mnemonic = elems[2]
-            if mnemonic in ignore['mnemonic']:
-                return 0
-            opcode = elems[1]
-            if int(opcode, 16) & ignore['opcode'] > 0:
-                return 0
-            elif count:
-                return 1
+    elems = parse_utils.decode_spike_line(source_line)
+    if elems is not None:
+        _, opcode, mnemonic, _ = elems
+        if mnemonic in ignore['mnemonic']:
+            return 0
+        if int(opcode, 16) & ignore['opcode'] > 0:
+            return 0
+        elif count:
+            return 1
+        else:
+            if mnemonic[0:2] == 'c.':
+                return 2
+            elif len(opcode) == 12:
+                return 6
             else:
-                if mnemonic[0:2] == 'c.':
-                    return 2
-                elif len(opcode) == 12:
-                    return 6
-                else:
-                    return 4 
+                return 4 
     return 0
 
 
 def parse_line(source_line: str, ignore, count: bool) -> int:
-    if source_line[0:1] == ' ' or source_line[0:1] in string.hexdigits:
-        elems: list[str] = source_line.strip() \
-            .replace('    ', ' ~ ') \
-            .replace('\t', ' ') \
-            .replace('  ', ' ') \
-            .replace('  ', ' ') \
-            .replace('  ', ' ') \
-            .replace(',', '') \
-            .replace(':', '') \
-            .replace(')', '') \
-            .replace('{', '') \
-            .replace('}', '') \
-            .replace('(', ' ') \
-            .split(' ')
-        elen = len(elems)
-        if elen >= 6:
-            mn_index = 5
-            if elen > 8 and elems[8][0:2] == 'k.':
-                mn_index = 8
-            
-            opcode = elems[1]
-            oplen = len(opcode)
-            if oplen >= 4:
-                mn_index = 4
-                if oplen == 8:
-                    mn_index = 3
-                    
-            else:
-                op_elems = elems[1:mn_index]
-                op_elems.reverse()
-                opcode = ''.join(op_elems).replace('~', '')
-                
-            mnemonic = elems[mn_index]
-            
-            if mnemonic.replace('c.', '') in ignore['mnemonic']:
-                return 0
-            
-            if count:
-                return 1
-            if len(opcode) % 2 != 0:
-                print(source_line)
-                print(opcode)
-            assert len(opcode) % 2 == 0
-            return len(opcode) / 2
+    elems = parse_utils.split_objdump_line(source_line)
+    if elems is not None:
+        _, opcode, mnemonic, _ = elems
+        
+        if mnemonic.replace('c.', '') in ignore['mnemonic']:
+            return 0
+        
+        if count:
+            return 1
+        if len(opcode) % 2 != 0:
+            print(source_line)
+            print(opcode)
+        assert len(opcode) % 2 == 0
+        return len(opcode) / 2
             
     return 0
 
@@ -127,6 +83,8 @@ def main(args):
                                 It must have at least the following attributes:
                                 - path: The base path where the asm files are located.
                                 - files: An iterable with the names of the asm to be processed.
+                                - jobs: The count of files evaluated in parallel.
+                                - cache: Load the evaluated values from the cache.
 
     '''
     path = str(Path(args.path).absolute())
@@ -158,21 +116,27 @@ def main(args):
         if spike:
             parser = eval_spike_line
 
-    file_vals: list[int] = []
+    fqpns: list[str] = []
     for file in args.files:
         if debug:
             print('File to analyze: ', file)
 
         fqpn = '{}/{}'.format(str(path), str(file))
         # fqpn = fqpn.replace('_trace.txt', '.asm')
+        fqpns.append(fqpn)
         
-        file_vals.append(parse_utils.parse_val_cnt(
-            fqpn, 
-            parser, 
-            ign,
-            static_file,
-            count
-        ))
+    file_vals: list[int] = parse_utils.map_files(
+        cache.bind(
+            parse_utils.parse_val_cnt, 
+            args.cache,
+            val_getter=parser, 
+            ignore=ign,
+            static_file=static_file,
+            count=count
+        ),
+        fqpns,
+        args.jobs
+    )
     base_val = file_vals[0]
     assert base_val > 0
     
@@ -215,6 +179,8 @@ if __name__ == '__main__':
     parser.add_argument('--count', type=bool, default=False, help='Generate based on instr count optimization')
     parser.add_argument('--spike', type=bool, default=False, help='Generate based on spike')
     parser.add_argument('--fact', type=bool, default=False, help='factor results')
+    parser.add_argument('--jobs', type=int, default=1, help='count of files evaluated in parallel')
+    parser.add_argument('--cache', type=bool, default=False, help='Load evaluated values from the cache in ' + cache.CACHE_DIR)
     
     parser.add_argument('--path', type=str, help='base path for the files') 
     parser.add_argument('--debug', type=bool, help='print debug messages')
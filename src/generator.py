@@ -1,5 +1,8 @@
 import os
+import io
 import argparse
+import contextlib
+from functools import partial
 from pathlib import Path
 import typing
 from enum import Enum
@@ -7,8 +10,8 @@ from time import perf_counter_ns
 
 import static
 import dynamic
-from tools import parse_utils, evaluator
-from model import register, instruction_model, immediate
+from tools import cache, parse_utils, evaluator, selection, trace_counter
+from model import register, instruction_model, immediate, program
 
 NANO_TO_MICOR = 1000
 
@@ -528,10 +531,36 @@ def extend(pat: InstFusion, inst: instruction_model.Instruction, first: bool = F
         pat.format.imm_widths += [max(1, imm.get_needed_bits())]
 
 
-def greedy_inst_gen(instructions: list[instruction_model.Instruction], bit_width: BitWitdth, op_len: int, ignore_mem: bool = True, one_imm: bool = True) -> set[InstFusion]:
+def is_ignored_mnemonic(mnem: str, ignore_mem: bool) -> bool:
+    'returns if instructions with the base mnemonic `mnem` are never part of a pattern'
+    is_ignored = ignore_mem and (mnem in instruction_model.load or mnem in instruction_model.store) 
+    is_ignored = is_ignored or mnem in ignore
+    is_ignored = is_ignored or mnem[0] == 'f'
+    return is_ignored
+
+
+def is_forbidden_next(pat: InstFusion, inst: instruction_model.Instruction, mnem: str) -> bool:
+    'returns if `inst` with the base mnemonic `mnem` must not follow the instructions of `pat`'
+    forbidden_second = mnem in illegal_second
+    prev_mnem = pat.insts[0].get_base_mnemonic()
+    return forbidden_second or ((prev_mnem == 'li' or prev_mnem == 'lui') and (inst.has_imm() or (mnem != 'mul' and mnem != 'div')))
+
+
+def finish(pat: InstFusion, fun_bits: int):
+    'widens the last immediate of `pat` to the bits left in its format'
+    if len(pat.format.imm_widths) > 0:
+        pat.format.imm_widths[-1] += pat.format.get_remainig_bits(fun_bits, pat.get_regs_coded(), pat.format.width == BitWitdth.COMPRESSED)
+        pat.format.imm_widths[-1] = max(1, pat.format.imm_widths[-1])
+
+
+def greedy_inst_gen(instructions: list[instruction_model.Instruction], bit_width: BitWitdth, op_len: int, ignore_mem: bool = True, one_imm: bool = True, blocks: program.BasicBlocks = None) -> set[InstFusion]:
     '''
     ToDo: take care of compressed regs for gen and pattern
+    
+    A new pattern is started at each branch of the `blocks` of the instructions.
     '''
+    if blocks is None:
+        blocks = program.BasicBlocks(instructions)
     new_insts: list[InstFusion] = []
     fun_bits = 0
     prev_pat: InstFusion = None
@@ -540,10 +569,10 @@ def greedy_inst_gen(instructions: list[instruction_model.Instruction], bit_width
     
     # print(len(instructions))
     
-    for inst in instructions:
+    for inst, branch in zip(instructions, blocks.branches):
         mnem = inst.get_base_mnemonic() 
               
-        if inst.get_base_mnemonic() in instruction_model.branch:
+        if branch:
             create_new = True
         
         if create_new or prev_pat == None:
@@ -553,14 +582,10 @@ def greedy_inst_gen(instructions: list[instruction_model.Instruction], bit_width
             create_new = False
         
         first = len(prev_pat.insts) == 0
-        is_ignored = ignore_mem and (mnem in instruction_model.load or mnem in instruction_model.store) 
-        is_ignored = is_ignored or mnem in ignore
-        is_ignored = is_ignored or mnem[0] == 'f'
+        is_ignored = is_ignored_mnemonic(mnem, ignore_mem)
         forbidden_second = False
         if len(prev_pat.insts) > 0:
-            forbidden_second = mnem in illegal_second
-            prev_mnem = prev_pat.insts[0].get_base_mnemonic()
-            forbidden_second = forbidden_second or ((prev_mnem == 'li' or prev_mnem == 'lui') and (inst.has_imm() or (mnem != 'mul' and mnem != 'div')))
+            forbidden_second = is_forbidden_next(prev_pat, inst, mnem)
         extendable = first or is_extendable(prev_pat, inst, fun_bits, one_imm)
         if not forbidden_second and not is_ignored and extendable:
             # Pattern is extendable to match inst
@@ -571,37 +596,108 @@ def greedy_inst_gen(instructions: list[instruction_model.Instruction], bit_width
             # Cannot extend pat further when a out gets consumed
             
         if create_new and prev_pat != None:
-            if len(prev_pat.format.imm_widths) > 0:
-                prev_pat.format.imm_widths[-1] += prev_pat.format.get_remainig_bits(fun_bits, prev_pat.get_regs_coded(), prev_pat.format.width == BitWitdth.COMPRESSED)
-                prev_pat.format.imm_widths[-1] = max(1, prev_pat.format.imm_widths[-1])
+            finish(prev_pat, fun_bits)
                 
             if len(prev_pat.insts) > 0:
                 new_insts += [prev_pat]
 
     return set(new_insts)
 
+def get_windows(instructions: list[instruction_model.Instruction], bit_width: BitWitdth, op_len: int, max_len: int, ignore_mem: bool = True, one_imm: bool = True, blocks: program.BasicBlocks = None):
+    '''
+    Yields the start and the pattern of every window of up to `max_len` instructions in which
+    each instruction consumes the output of the one before and that fits into one instruction.
+
+    Windows stay within one of the `blocks` and do not contain its branch. Each instruction is
+    checked like in `greedy_inst_gen`. The yielded patterns are extended by the following
+    windows of the same start, a copy has to be built to keep one.
+    If the `blocks` have execution counts, the blocks a trace never entered are skipped.
+    '''
+    if blocks is None:
+        blocks = program.BasicBlocks(instructions)
+    fun_bits = 0
+    branches = blocks.branches
+    counts = blocks.counts
+    mnems = [inst.get_base_mnemonic() for inst in instructions]
+    for block, (block_start, block_end) in enumerate(blocks):
+        if counts is not None and counts[block] == 0:
+            continue
+        for start in range(block_start, block_end):
+            mnem = mnems[start]
+            if branches[start] or is_ignored_mnemonic(mnem, ignore_mem):
+                continue
+            pat = InstFusion(Format(bit_width, op_len, []))
+            extend(pat, instructions[start], first=True)
+            for i in range(start + 1, min(start + max_len, block_end)):
+                inst = instructions[i]
+                mnem = mnems[i]
+                if branches[i] or is_ignored_mnemonic(mnem, ignore_mem):
+                    break
+                if is_forbidden_next(pat, inst, mnem) or not is_extendable(pat, inst, fun_bits, one_imm):
+                    break
+                extend(pat, inst)
+                yield start, pat
+
+
+def mine_inst_gen(instructions: list[instruction_model.Instruction], bit_width: BitWitdth, op_len: int, max_len: int, min_support: int = 2, ignore_mem: bool = True, one_imm: bool = True, blocks: program.BasicBlocks = None) -> set[InstFusion]:
+    '''
+    Proposes the patterns of all windows of `get_windows` that occur at least `min_support` times.
+
+    Unlike `greedy_inst_gen` every instruction starts windows, so sequences inside or across
+    the chains of the greedy generation are found too. The windows are counted by template
+    and count of in and out registers and immediates in one pass. Of each template the most
+    frequent key is proposed, built from its first window.
+    '''
+    support: dict[tuple, int] = {}
+    first: dict[tuple, tuple[int, int]] = {}
+    for start, pat in get_windows(instructions, bit_width, op_len, max_len, ignore_mem, one_imm, blocks):
+        key = (tuple(pat.template), pat.t_in_reg, pat.t_out_reg, len(pat.format.imm_widths))
+        if key in support:
+            support[key] += 1
+        else:
+            support[key] = 1
+            first[key] = (start, len(pat.template))
+    
+    best: dict[tuple[str, ...], tuple] = {}
+    for key, count in support.items():
+        if count >= min_support and (key[0] not in best or count > support[best[key[0]]]):
+            best[key[0]] = key
+    
+    result = set()
+    for key in best.values():
+        start, length = first[key]
+        pat = InstFusion(Format(bit_width, op_len, []))
+        extend(pat, instructions[start], first=True)
+        for inst in instructions[start + 1:start + length]:
+            extend(pat, inst)
+        finish(pat, 0)
+        result.add(pat)
+    return result
+
+
 def merge_patterns(pats: set[InstFusion]) -> set[InstFusion]:
+    '''
+    Removes all patterns whose template is shared with another pattern, as the matches of
+    a template would be counted once for each of its patterns.
+
+    The patterns are put into buckets by their template in one pass.
+    '''
+    buckets: dict[tuple[str, ...], list[InstFusion]] = {}
+    for pat in pats:
+        buckets.setdefault(tuple(pat.template), []).append(pat)
     result = pats.copy()
-    for pat1 in pats:
-        for pat2 in pats:
-            if pat2 in result and pat1 != pat2:
-                remove = len(pat1.in_regs) == len(pat2.in_regs) \
-                    and len(pat1.out_regs) == len(pat2.out_regs) \
-                    and pat1.template == pat2.template \
-                    and len(pat1.format.imm_widths) == len(pat2.format.imm_widths) \
-                    and pat1.format.imm_widths[-1] > pat2.format.imm_widths[-1]
-                remove = remove or pat1.template == pat2.template
-                if remove:
-                    result.remove(pat2)
-            
+    for bucket in buckets.values():
+        if len(bucket) > 1:
+            result.difference_update(bucket)
     return result
 
 
-def match_pattern(insts: list[instruction_model.Instruction], pat: InstFusion, index: int) -> tuple[bool, list[instruction_model.Instruction], int]:
+def match_positions(insts: list[instruction_model.Instruction], pat: InstFusion, index: int) -> tuple[bool, list[int], int]:
+    'like `match_pattern`, but returns the positions of the matched instructions in `insts`'
     pat_match = True
     n = len(pat.template)
     i = index
-    matched = []
+    positions = []
     matched_len = 0
     total_imm = 0
     out_regs = []
@@ -617,41 +713,51 @@ def match_pattern(insts: list[instruction_model.Instruction], pat: InstFusion, i
             if candidate.has_imm():
                 total_imm += candidate.get_imm().get_needed_bits()
             out_regs += [candidate.get_dest()]
-            matched += [candidate]
+            positions += [i]
             matched_len += 1
         else:
             if consumes_out(out_regs, candidate):
                 pat_match = False
-            if candidate.get_base_mnemonic() in instruction_model.branch:
+            if candidate.info.ends_block:
                 pat_match = False
                 
         i += 1
-    return pat_match, matched, total_imm
+    return pat_match, positions, total_imm
 
 
-def get_dynamic_count(matched, inst_cnt):
-    contains = True
+def match_pattern(insts: list[instruction_model.Instruction], pat: InstFusion, index: int) -> tuple[bool, list[instruction_model.Instruction], int]:
+    pat_match, positions, total_imm = match_positions(insts, pat, index)
+    return pat_match, [insts[i] for i in positions], total_imm
+
+
+def get_dynamic_count(positions: list[int], exec_counts: list[int]):
+    'returns the mean execution count of the instructions at `positions`'
     cnt_sum = 0
-    for inst in matched:
-        opcode = inst.get_address()
-        if opcode in inst_cnt:
-            cnt_sum += inst_cnt[opcode][1]
-            contains = False
+    for i in positions:
+        cnt_sum += exec_counts[i]
     
-    # if not contains:
+    # if cnt_sum == 0:
     #     print("INFO: Sequence never executed:")
-    #     for mi in matched:
-    #         print('    ', mi)
-    return cnt_sum / len(matched)
+    #     for i in positions:
+    #         print('    ', i)
+    return cnt_sum / len(positions)
 
 
-def get_size_improvement(pat: InstFusion, insts: list[instruction_model.Instruction], index: int, inst_cnt) -> int:
-    pat_match, matched, total_imm = match_pattern(insts, pat, index)
+def get_size_improvement(pat: InstFusion, insts: list[instruction_model.Instruction], index: int, exec_counts: list[int], match=None) -> int:
+    '''
+    Returns the bytes saved by replacing the match of `pat` at `index` by one instruction.
+
+    `exec_counts` are the execution counts of `insts` by position, empty for a static analysis.
+    `match` is the result of `match_positions` at `index` if it is already known.
+    '''
+    if match is None:
+        match = match_positions(insts, pat, index)
+    pat_match, positions, total_imm = match
     imm_match = total_imm <= sum(pat.format.imm_widths)
     if pat_match and imm_match:
-        improvement = evaluator.get_byte_count(matched) - int(pat.format.width.value/8)
-        if len(inst_cnt) > 0:
-            cnt_sum = get_dynamic_count(matched, inst_cnt)
+        improvement = evaluator.get_byte_count([insts[i] for i in positions]) - int(pat.format.width.value/8)
+        if len(exec_counts) > 0:
+            cnt_sum = get_dynamic_count(positions, exec_counts)
             if cnt_sum > 0:
                 improvement *= cnt_sum
         if improvement >= 0:
@@ -659,13 +765,16 @@ def get_size_improvement(pat: InstFusion, insts: list[instruction_model.Instruct
     return 0
        
        
-def get_inst_count_reduction(pat: InstFusion, insts: list[instruction_model.Instruction], index: int, inst_cnt) -> int:
-    pat_match, matched, total_imm = match_pattern(insts, pat, index)
+def get_inst_count_reduction(pat: InstFusion, insts: list[instruction_model.Instruction], index: int, exec_counts: list[int], match=None) -> int:
+    'like `get_size_improvement` for the count of instructions saved'
+    if match is None:
+        match = match_positions(insts, pat, index)
+    pat_match, positions, total_imm = match
     imm_match = total_imm <= sum(pat.format.imm_widths)
     if pat_match and imm_match:
         improvement = len(pat.insts) - 1
-        if len(inst_cnt) > 0:
-            cnt_sum = get_dynamic_count(matched, inst_cnt)
+        if len(exec_counts) > 0:
+            cnt_sum = get_dynamic_count(positions, exec_counts)
             if cnt_sum > 0:
                 improvement *= cnt_sum
         if improvement >= 0:
@@ -673,22 +782,255 @@ def get_inst_count_reduction(pat: InstFusion, insts: list[instruction_model.Inst
     return 0
        
 
-def select_insts(insts: list[instruction_model.Instruction], proposed: set[InstFusion], inst_cnt, metric, width) -> typing.Dict[InstFusion, int]:
+class PatternTrie:
+    '''
+    The templates of patterns as a trie of base mnemonics.
+
+    Patterns with a common prefix share the matching of the prefix, so all patterns are
+    matched in one pass over the instructions by `match_trie`.
+    '''
+    def __init__(self):
+        self.children: dict[str, PatternTrie] = {}
+        # the patterns whose template ends at this node
+        self.pats: list[InstFusion] = []
+
+    def add(self, pat: InstFusion):
+        node = self
+        for mnem in pat.template:
+            node = node.children.setdefault(mnem, PatternTrie())
+        node.pats.append(pat)
+
+    def get_pats(self):
+        'yields the patterns of this node and of all nodes below'
+        yield from self.pats
+        for child in self.children.values():
+            yield from child.get_pats()
+
+
+def match_trie(insts: list[instruction_model.Instruction], mnems: list[str], branches: list[bool], node: PatternTrie, index: int, match: tuple[bool, list[int], int], out_regs: list[register.Reg], found):
+    '''
+    Continues the `match` of the template of `node` at `index` with its children, like
+    `match_positions` does for each pattern below `node`.
+
+    `mnems` are the base mnemonics of `insts` and `branches` their `BasicBlocks.branches`. `found(pat, match)` is called with the result
+    of `match_positions` for every pattern below `node` that is not rejected.
+    '''
+    _, positions, total_imm = match
+    pending = dict(node.children)
+    insts_len = len(insts)
+    i = index
+    while pending and insts_len > i:
+        candidate: instruction_model.Instruction = insts[i]
+        mnem = mnems[i]
+        child = pending.pop(mnem, None)
+        if child is not None:
+            child_imm = total_imm
+            if candidate.has_imm():
+                child_imm += candidate.get_imm().get_needed_bits()
+            child_match = (True, positions + [i], child_imm)
+            for pat in child.pats:
+                found(pat, child_match)
+            match_trie(insts, mnems, branches, child, i + 1, child_match, out_regs + [candidate.get_dest()], found)
+        if pending and (consumes_out(out_regs, candidate) or branches[i]):
+            # the remaining patterns do not match
+            return
+        i += 1
+    # the instructions ended, the remaining patterns match partially
+    for child in pending.values():
+        for pat in child.get_pats():
+            found(pat, match)
+
+
+def match_all(insts: list[instruction_model.Instruction], proposed: set[InstFusion], visit, blocks: program.BasicBlocks = None):
+    '''
+    Matches all `proposed` patterns with more than one instruction at every index of `insts`
+    in one pass over their `PatternTrie`.
+
+    `visit(pat, index, match)` is called in the order of the indices with the result of
+    `match_positions` for every match that `select_insts` evaluates.
+    '''
+    if blocks is None:
+        blocks = program.BasicBlocks(insts)
     inst_len = len(insts)
+    trie = PatternTrie()
+    for pat in proposed:
+        if len(pat.template) > 1:
+            trie.add(pat)
+    
+    mnems = [inst.get_base_mnemonic() for inst in insts]
+    for index in range(inst_len):
+        node = trie.children.get(mnems[index])
+        if node is None:
+            continue
+        inst = insts[index]
+        total_imm = 0
+        if inst.has_imm():
+            total_imm += inst.get_imm().get_needed_bits()
+        
+        def found(pat, match):
+            if inst_len >= index + len(pat.template):
+                visit(pat, index, match)
+        
+        match_trie(insts, mnems, blocks.branches, node, index + 1, (True, [index], total_imm), [inst.get_dest()], found)
+
+
+def select_insts(insts: list[instruction_model.Instruction], proposed: set[InstFusion], exec_counts, metric, width, blocks: program.BasicBlocks = None) -> typing.Dict[InstFusion, int]:
     op_len = BASE_OP_LEN + CUST_OP_LEN
     pat_sel_count = get_available_inst_count(op_len, width)
     pat_eval: map[InstFusion, int] = {
-        pat: sum([
-            metric(pat, insts, index, inst_cnt)
-            for index in range(inst_len)
-            if pat.template[0] == insts[index].get_base_mnemonic() and inst_len >= index + len(pat.template) and len(pat.template) > 1
-        ])
+        pat: 0
         for pat in proposed
     }
     
+    def visit(pat, index, match):
+        pat_eval[pat] += metric(pat, insts, index, exec_counts, match)
+    
+    match_all(insts, proposed, visit, blocks)
     return evaluator.sort_dict(pat_eval, pat_sel_count)
+
+
+def get_match_sites(insts: list[instruction_model.Instruction], proposed: set[InstFusion], exec_counts, metric, blocks: program.BasicBlocks = None) -> typing.Dict[InstFusion, list[tuple[list[int], int]]]:
+    'returns for each pattern the positions of the matched instructions and the improvement of each improving match'
+    sites = {
+        pat: []
+        for pat in proposed
+    }
+    
+    def visit(pat, index, match):
+        improvement = metric(pat, insts, index, exec_counts, match)
+        if improvement > 0:
+            sites[pat].append((match[1], improvement))
+    
+    match_all(insts, proposed, visit, blocks)
+    return sites
+
+
+def select_greedy(sites: typing.Dict[InstFusion, list[tuple[list[int], int]]], pat_sel_count: int) -> list[tuple[InstFusion, int]]:
+    '''
+    Selects up to `pat_sel_count` patterns one after another with `selection.greedy`, each
+    with the largest improvement on the instructions not used by the patterns selected before.
+
+    Returns the selected patterns in the order of selection with their remaining improvement,
+    so the improvements can be summed up without counting an instruction twice.
+    '''
+    pats = list(sites.keys())
+    candidates = [(0, sites[pat]) for pat in pats]
+    return [
+        (pats[index], improvement)
+        for index, improvement in selection.greedy(candidates, {0: pat_sel_count})
+    ]
+
+
+def select_exact(width_sites: typing.Dict[BitWitdth, typing.Dict[InstFusion, list[tuple[list[int], int]]]], time_limit: float, verbose: bool) -> typing.Dict[BitWitdth, list[tuple[InstFusion, int]]]:
+    '''
+    Selects the patterns of all widths together with `selection.branch_and_bound`, so that
+    each instruction is replaced at most once and the opcodes of each width suffice.
+
+    The search starts from the greedy selection and stops after `time_limit` seconds with the
+    best selection found, which is never worse than the greedy one. With `verbose` each better
+    selection and the gap of the greedy selection to the result are printed.
+    '''
+    op_len = BASE_OP_LEN + CUST_OP_LEN
+    pats = []
+    candidates = []
+    for width, sites in width_sites.items():
+        for pat, pat_sites in sites.items():
+            pats.append(pat)
+            candidates.append((width, pat_sites))
+    budgets = {
+        width: get_available_inst_count(op_len, width)
+        for width in width_sites
+    }
+    
+    greedy_selection = selection.greedy(candidates, budgets)
+    greedy_picks = [index for index, _ in greedy_selection]
+    
+    def on_improve(value, seconds):
+        if verbose:
+            print('Best selection so far:', value, 'after', int(round(seconds * 1000, 0)), 'ms')
     
+    picks, value, finished = selection.branch_and_bound(candidates, budgets, time_limit, greedy_picks, on_improve)
+    if verbose:
+        greedy_value = sum(improvement for _, improvement in greedy_selection)
+        state = 'search finished' if finished else 'time limit reached'
+        print('Greedy selection:', greedy_value, 'best selection:', value, '(', state, ', gap', evaluator.rel(value - greedy_value, max(value, 1)), '%)')
     
+    result = {width: [] for width in width_sites}
+    for index, improvement in picks:
+        result[candidates[index][0]].append((pats[index], improvement))
+    return result
+
+
+def generate_and_select(instructions: list[instruction_model.Instruction], blocks: program.BasicBlocks, exec_counts: list[int], metric, overlap: bool, window: int, config: tuple[BitWitdth, bool]) -> tuple[list[tuple[InstFusion, int]], list[int]]:
+    '''
+    Generates, merges and selects the instructions of one configuration of width and imm mode.
+    All stages share the `blocks` of the instructions.
+
+    Returns the selected patterns with their improvement, ranked like `select_insts`, and the
+    elapsed micros of the generation, the merge and the selection.
+    With `overlap` the match sites of `get_match_sites` are returned instead of a ranking,
+    they are selected by `select_greedy` after the configurations are joined.
+    With a `window` longer than one instruction the patterns of `mine_inst_gen` with templates
+    the greedy generation does not propose are added to the candidates.
+    '''
+    width, one_imm = config
+    op_len = BASE_OP_LEN + CUST_OP_LEN
+    times = []
+    
+    start = perf_counter_ns()
+    new_insts = greedy_inst_gen(instructions, width, op_len, ignore_mem=True, one_imm=one_imm, blocks=blocks)
+    if window > 1:
+        templates = {tuple(pat.template) for pat in new_insts}
+        mined = mine_inst_gen(instructions, width, op_len, window, ignore_mem=True, one_imm=one_imm, blocks=blocks)
+        new_insts |= {pat for pat in mined if tuple(pat.template) not in templates}
+    times.append(int(round((perf_counter_ns() - start)/NANO_TO_MICOR, 0)))
+    
+    start = perf_counter_ns()
+    new_insts = merge_patterns(new_insts)
+    times.append(int(round((perf_counter_ns() - start)/NANO_TO_MICOR, 0)))
+    
+    start = perf_counter_ns()
+    if overlap:
+        frequencies = get_match_sites(instructions, new_insts, exec_counts, metric, blocks)
+    else:
+        frequencies = list(select_insts(instructions, new_insts, exec_counts, metric, width, blocks))
+    times.append(int(round((perf_counter_ns() - start)/NANO_TO_MICOR, 0)))
+    return frequencies, times
+
+
+def union_selections(selections: list[list[tuple[InstFusion, int]]], pat_sel_count: int) -> list[tuple[InstFusion, int]]:
+    '''
+    Unions the ranked patterns of several configurations and ranks them again.
+
+    Of the patterns with the same template only the one with the largest improvement is kept,
+    on equal improvements the one of the earlier configuration.
+    '''
+    best: dict[tuple[str, ...], tuple[InstFusion, int]] = {}
+    for frequencies in selections:
+        for pat, improvement in frequencies:
+            key = tuple(pat.template)
+            if key not in best or improvement > best[key][1]:
+                best[key] = (pat, improvement)
+    return evaluator.sort_dict(dict(best.values()), pat_sel_count)
+
+
+def union_sites(selections: list[typing.Dict[InstFusion, list[tuple[list[int], int]]]]) -> typing.Dict[InstFusion, list[tuple[list[int], int]]]:
+    'like `union_selections` for the match sites of `get_match_sites`'
+    best: dict[tuple[str, ...], tuple[InstFusion, int]] = {}
+    for sites in selections:
+        for pat, pat_sites in sites.items():
+            key = tuple(pat.template)
+            improvement = sum(site_improvement for _, site_improvement in pat_sites)
+            if key not in best or improvement > best[key][1]:
+                best[key] = (pat, improvement)
+    return {
+        pat: sites[pat]
+        for sites in selections
+        for pat in sites
+        if best[tuple(pat.template)][0] is pat
+    }
+
+
 def get_available_inst_count(op_len, width):
     if width == BitWitdth.FULL:  
         custom_opcode_cnt = len(base_32_opcodes) # + len(reserved_32_opcodes)
@@ -719,21 +1061,18 @@ InstructionSet ''' + ise_name + ''' extends RV32I {
         file.write(file_content)
 
 
-def main(args):
+def process_file(args, path: str, file: str) -> tuple[int, int]:
     '''
-    The main entry point for the script that generates Instructions.
-
-    This function takes command-line arguments, extracts instructions from each provided file,
-    performs the instruction generation, selection and evaluation.
+    Generates, selects and evaluates the instructions for one file.
 
     Parameters:
-    args (argparse.Namespace): command-line arguments.
-                                It must have at least the following attributes:
-                                - path: The base path where the asm files are located.
-                                - files: An iterable with the names of the asm to be processed.
+    - args: the command-line arguments of `main`.
+    - path: the absolute base path of the file.
+    - file: the name of the file to process.
 
+    Returns
+    - `tuple[int, int]`: the base and the improvement summed up for the overall average.
     '''
-    path = str(Path(args.path).absolute())
     debug = args.debug
     static_file = args.static
     dynamic_file = args.dynamic
@@ -742,6 +1081,10 @@ def main(args):
     exe_time = args.time
     print_results = args.results
     csv = args.csv
+    use_mmap = args.mmap
+    use_cache = args.cache
+    exact = args.exact
+    overlap = args.overlap or exact
     
     total_base = 0
     total_new = 0
@@ -751,193 +1094,258 @@ def main(args):
         'opcode': 0x80000000
     }
     
-    # print('Start parsing')
-    if debug:
-        print('Base Path: ', path)
-        
-    for file in args.files:
-        if debug or True:
-            print('File to analyze: ', file)
+    if debug or True:
+        print('File to analyze: ', file)
 
-        fqpn = '{}/{}'.format(str(path), str(file))
+    fqpn = '{}/{}'.format(str(path), str(file))
+    
+    start = perf_counter_ns()
+    parse = cache.bind(parse_utils.parse_file, use_cache, parse_line=static.parse_line, ignore=ign)
+    prog = parse(fqpn.replace('_trace_etiss.txt', '.etiss_asm'))
+    instructions = prog.instructions
+    blocks = prog.get_blocks()
+    print("Instructions parsed:", len(instructions))
+    if exe_time:
+        stop = perf_counter_ns()
+        elapsed_micro = int(round((stop - start)/NANO_TO_MICOR, 0))
+        if csv:
+            print(file.replace('.etiss_asm', ''), len(instructions), elapsed_micro, end=',', sep=',')
+        else:
+            print('Target:', file)
+            print('Static instructions to use:', len(instructions))
+            print('Static parse time: ', elapsed_micro, 'micros')
+    
+    addr_instruction_map: map[int, instruction_model.Instruction] = {
+        inst.get_address(): inst
+        for inst in instructions
+    }
+    
+    if debug:
+        for inst in instructions:
+            print(inst)
+            assert inst.get_address() in addr_instruction_map
+        print(len(instructions), '==', len(addr_instruction_map.keys()))
+    
+    inst_cnt = {}
+    # execution count of each instruction by position, empty for a static analysis
+    exec_counts = []
+    
+    if static_file and dynamic_file:
+        print('Error: static and dynamic mix currently not supported')
+        assert False 
+    elif dynamic_file:
+        if '.etiss_asm' in fqpn:
+            fqpn = fqpn.replace('.etiss_asm', '_trace.txt')  
+        if debug:
+            print('File to analyze: ', fqpn)   
         
         start = perf_counter_ns()
-        instructions = parse_utils.parse_file(
-            fqpn.replace('_trace_etiss.txt', '.etiss_asm'),
-            static.parse_line, 
-            ign
-        )
-        print("Instructions parsed:", len(instructions))
+        if use_cache:
+            # the counts do not reference the instructions and can be cached 
+            addrs = trace_counter.get_addrs(addr_instruction_map)
+            counts = cache.cached(fqpn, trace_counter.count_etiss_addrs, addrs=addrs)
+            inst_cnt = trace_counter.get_address_cnt(addrs, counts, addr_instruction_map)
+        elif use_mmap:
+            inst_cnt = trace_counter.parse_etiss_address_cnt(fqpn, addr_instruction_map)
+        else:
+            # dynamic.get_spike_addr 
+            inst_cnt = parse_utils.parse_address_cnt(
+                fqpn,
+                addr_instruction_map, 
+                dynamic.get_etiss_addr
+            )
+        
         if exe_time:
             stop = perf_counter_ns()
             elapsed_micro = int(round((stop - start)/NANO_TO_MICOR, 0))
+            dynamic_inst_cnt = sum([inst_cnt[op][1] for op in inst_cnt])
             if csv:
-                print(file.replace('.etiss_asm', ''), len(instructions), elapsed_micro, end=',', sep=',')
+                print(dynamic_inst_cnt, elapsed_micro, end=',', sep=',')
             else:
-                print('Target:', file)
-                print('Static instructions to use:', len(instructions))
-                print('Static parse time: ', elapsed_micro, 'micros')
-        
-        addr_instruction_map: map[int, instruction_model.Instruction] = {
-            inst.get_address(): inst
-            for inst in instructions
-        }
-        
+                print('Dynamic instructions to use:', dynamic_inst_cnt)
+                print('Dynamic parse time: ', elapsed_micro, 'micros')
         if debug:
-            for inst in instructions:
-                print(inst)
-                assert inst.get_address() in addr_instruction_map
-            print(len(instructions), '==', len(addr_instruction_map.keys()))
-        
-        inst_cnt = {}
+            for opcode in inst_cnt:
+                inst, cnt = inst_cnt[opcode]
+                print(cnt, ' : ', inst)
         
-        if static_file and dynamic_file:
-            print('Error: static and dynamic mix currently not supported')
-            assert False 
-        elif dynamic_file:
-            if '.etiss_asm' in fqpn:
-                fqpn = fqpn.replace('.etiss_asm', '_trace.txt')  
-            if debug:
-                print('File to analyze: ', fqpn)   
-            
-            start = perf_counter_ns()
-            # dynamic.get_spike_addr 
-            inst_cnt = parse_utils.parse_address_cnt(
-                fqpn,
-                addr_instruction_map, 
-                dynamic.get_etiss_addr
-            )
-            
-            if exe_time:
-                stop = perf_counter_ns()
-                elapsed_micro = int(round((stop - start)/NANO_TO_MICOR, 0))
-                dynamic_inst_cnt = sum([inst_cnt[op][1] for op in inst_cnt])
-                if csv:
-                    print(dynamic_inst_cnt, elapsed_micro, end=',', sep=',')
-                else:
-                    print('Dynamic instructions to use:', dynamic_inst_cnt)
-                    print('Dynamic parse time: ', elapsed_micro, 'micros')
-            if debug:
-                for opcode in inst_cnt:
-                    inst, cnt = inst_cnt[opcode]
-                    print(cnt, ' : ', inst)
-        
-        name = file.split('.')[0]
-        ext_file_name: str = '_' + name + '_'
-        if static_file and dynamic_file:
-            assert False
-        elif static_file:
-            ext_file_name += 'static'
+        addrs, counts = trace_counter.get_count_arrays(inst_cnt)
+        exec_counts = trace_counter.join_counts(trace_counter.get_inst_addrs(instructions), addrs, counts).tolist()
+        blocks.set_exec_counts(exec_counts)
+    
+    name = file.split('.')[0]
+    ext_file_name: str = '_' + name + '_'
+    if static_file and dynamic_file:
+        assert False
+    elif static_file:
+        ext_file_name += 'static'
+    elif dynamic_file:
+        ext_file_name += 'dynamic' 
+    else:
+        assert False
+    if size and count:
+        assert False
+    elif size:
+        ext_file_name += '_size'
+    elif count:
+        ext_file_name += '_count'
+    else:
+        assert False
+    ext_file_name += '.core_desc'
+    if len(instructions) > 0:
+        opti_base = 1
+        if static_file:
+            if size and count:
+                print('Error: optimization mix currently not implemented')
+            elif size:
+                opti_base = evaluator.get_byte_count(instructions)
+            elif count:
+                opti_base = len(instructions)
+            else:
+                print('ERROR: eighter size or count should be set')
         elif dynamic_file:
-            ext_file_name += 'dynamic' 
+            if size and count:
+                print('Error: optimization mix currently not implemented')
+            elif size:
+                opti_base = evaluator.get_cnt_byte_count(inst_cnt)
+            elif count:
+                opti_base = sum(pair[1] for pair in [*map(inst_cnt.get, inst_cnt.keys())])
+            else:
+                print('ERROR: eighter size or count should be set')
         else:
             assert False
+                
         if size and count:
+            print('Error: optimization mix currently not implemented')
             assert False
         elif size:
-            ext_file_name += '_size'
+            metric = get_size_improvement
         elif count:
-            ext_file_name += '_count'
-        else:
-            assert False
-        ext_file_name += '.core_desc'
-        if len(instructions) > 0:
-            opti_base = 1
-            if static_file:
-                if size and count:
-                    print('Error: optimization mix currently not implemented')
-                elif size:
-                    opti_base = evaluator.get_byte_count(instructions)
-                elif count:
-                    opti_base = len(instructions)
-                else:
-                    print('ERROR: eighter size or count should be set')
-            elif dynamic_file:
-                if size and count:
-                    print('Error: optimization mix currently not implemented')
-                elif size:
-                    opti_base = evaluator.get_cnt_byte_count(inst_cnt)
-                elif count:
-                    opti_base = sum(pair[1] for pair in [*map(inst_cnt.get, inst_cnt.keys())])
-                else:
-                    print('ERROR: eighter size or count should be set')
+            metric = get_inst_count_reduction
+        
+        widths = [BitWitdth.FULL, BitWitdth.EXTENDED]
+        configs = [
+            (width, one_imm)
+            for width in widths
+            for one_imm in [True, False]
+        ]
+        results = parse_utils.map_files(partial(generate_and_select, instructions, blocks, exec_counts, metric, overlap, args.window), configs, args.workers)
+        
+        if exact:
+            exact_selection = select_exact({
+                width: union_sites([
+                    sites
+                    for config, (sites, _) in zip(configs, results)
+                    if config[0] == width
+                ])
+                for width in widths
+            }, args.time_limit, not csv)
+        
+        for width in widths:
+            file_name = 'ARISE' + str(width.value) + ext_file_name
+            op_len = BASE_OP_LEN + CUST_OP_LEN
+            pat_sel_count = get_available_inst_count(op_len, width)
+            width_results = [
+                result
+                for config, result in zip(configs, results)
+                if config[0] == width
+            ]
+            if exact:
+                frequencies = exact_selection[width]
+            elif overlap:
+                frequencies = select_greedy(union_sites([sites for sites, _ in width_results]), pat_sel_count)
             else:
-                assert False
-                    
-            for width in [BitWitdth.FULL, BitWitdth.EXTENDED]:
-                file_name = 'ARISE' + str(width.value) + ext_file_name
-                op_len = BASE_OP_LEN + CUST_OP_LEN
-                pat_sel_count = get_available_inst_count(op_len, width)
-                # print('Start Generating')
-                # print(width)
-                
-                start = perf_counter_ns()   
-                new_insts: list[InstFusion] = greedy_inst_gen(instructions, width, op_len, ignore_mem=True, one_imm=True)
-                if exe_time:
-                    stop = perf_counter_ns()
-                    elapsed_micro = int(round((stop - start)/NANO_TO_MICOR, 0))
-                    if csv:
-                        print(elapsed_micro, end=',', sep='')
-                    else:
-                        print('Generation elapsed time: ', elapsed_micro, 'micros')
-                
-                
-                new_insts.union(greedy_inst_gen(instructions, width, op_len, ignore_mem=True, one_imm=False))
-                #print('Start Merging')
-                
-                start = perf_counter_ns() 
-                new_insts = merge_patterns(new_insts)
-                if exe_time:
-                    stop = perf_counter_ns()
-                    elapsed_micro = int(round((stop - start)/NANO_TO_MICOR, 0))
-                    if csv:
-                        print(elapsed_micro, end=',', sep='')
-                    else:
-                        print('Merge elapsed time: ', elapsed_micro, 'micros')
-                
-                # print('Start Selecting')
-                
-                if size and count:
-                    print('Error: optimization mix currently not implemented')
-                    assert False
-                elif size:
-                    metric = get_size_improvement
-                elif count:
-                    metric = get_inst_count_reduction
-                
-                
-                start = perf_counter_ns()   
-                frequencies = select_insts(instructions, new_insts, inst_cnt, metric, width)
-                if exe_time:
-                    stop = perf_counter_ns()
-                    elapsed_micro = int(round((stop - start)/NANO_TO_MICOR, 0))
-                    if csv:
-                        print(elapsed_micro, end='', sep='')
-                    else:
-                        print('Selection elapsed time: ', elapsed_micro, 'micros')
-                    print()
-                
-                selected: list[InstFusion] = []
-                total_improvement = 0
-                i = 0
-                for inst, improvement in frequencies:
-                    if len(inst.template) > 1 and i < pat_sel_count:
-                        selected += [inst]
-                        if print_results:
-                            total_improvement += improvement
-                            total_base += opti_base
-                            total_new += total_improvement
-                            factor = evaluator.rel(improvement, opti_base)
-                            print(i, ':', inst, ': ', improvement, '(', factor,'%)')
-                        i += 1
-                if print_results:  
-                    met = 'byte'
-                    if count:
-                        met = 'Instructions'
-                    print('Total Improvement: ', total_improvement, met, '(', evaluator.rel(total_improvement, opti_base),'%)')
-                    print()
-                if not exe_time:
-                    write_cdsl(path, name, file_name, selected, width, pat_sel_count, op_len)    
+                frequencies = union_selections([ranked for ranked, _ in width_results], pat_sel_count)
+            
+            if exe_time:
+                # the time of each step summed up over the imm modes
+                gen_micro, merge_micro, select_micro = [sum(step) for step in zip(*[times for _, times in width_results])]
+                if csv:
+                    print(gen_micro, merge_micro, select_micro, end='', sep=',')
+                else:
+                    print('Generation elapsed time: ', gen_micro, 'micros')
+                    print('Merge elapsed time: ', merge_micro, 'micros')
+                    print('Selection elapsed time: ', select_micro, 'micros')
+                print()
+            
+            selected: list[InstFusion] = []
+            total_improvement = 0
+            i = 0
+            for inst, improvement in frequencies:
+                if len(inst.template) > 1 and i < pat_sel_count:
+                    selected += [inst]
+                    if print_results:
+                        total_improvement += improvement
+                        total_base += opti_base
+                        total_new += total_improvement
+                        factor = evaluator.rel(improvement, opti_base)
+                        print(i, ':', inst, ': ', improvement, '(', factor,'%)')
+                    i += 1
+            if print_results:  
+                met = 'byte'
+                if count:
+                    met = 'Instructions'
+                print('Total Improvement: ', total_improvement, met, '(', evaluator.rel(total_improvement, opti_base),'%)')
+                print()
+            if not exe_time:
+                write_cdsl(path, name, file_name, selected, width, pat_sel_count, op_len)
+    return total_base, total_new
+
+
+def process_file_captured(args, path: str, file: str) -> tuple[str, int, int]:
+    '''
+    Runs `process_file` in a worker and returns its output together with the results,
+    so the outputs of parallel runs can be printed in the order of the files.
+    '''
+    with io.StringIO() as out:
+        with contextlib.redirect_stdout(out):
+            total_base, total_new = process_file(args, path, file)
+        return out.getvalue(), total_base, total_new
+
+
+def main(args):
+    '''
+    The main entry point for the script that generates Instructions.
+
+    This function takes command-line arguments, extracts instructions from each provided file,
+    performs the instruction generation, selection and evaluation.
+
+    Parameters:
+    args (argparse.Namespace): command-line arguments.
+                                It must have at least the following attributes:
+                                - path: The base path where the asm files are located.
+                                - files: An iterable with the names of the asm to be processed.
+                                - jobs: The count of files processed in parallel.
+                                - workers: The count of configurations of width and imm mode
+                                           processed in parallel per file.
+                                - window: The length of the mined windows, 0 to only use the greedy chains.
+
+    '''
+    path = str(Path(args.path).absolute())
+    debug = args.debug
+    dynamic_file = args.dynamic
+    count  = args.count
+    print_results = args.results
+    
+    total_base = 0
+    total_new = 0
+    
+    # print('Start parsing')
+    if debug:
+        print('Base Path: ', path)
+    
+    if args.jobs > 1:
+        results = parse_utils.map_files(partial(process_file_captured, args, path), args.files, args.jobs)
+        for output, file_base, file_new in results:
+            print(output, end='')
+            total_base += file_base
+            total_new += file_new
+    else:
+        for file in args.files:
+            file_base, file_new = process_file(args, path, file)
+            total_base += file_base
+            total_new += file_new
+    
     if print_results:
         print()
         ty = 'static'
@@ -959,6 +1367,14 @@ if __name__ == '__main__':
     parser.add_argument('--time', type=bool, default=False, help='Measure exe time')
     parser.add_argument('--csv', type=bool, default=False, help='Print time in CSV')
     parser.add_argument('--results', type=bool, default=False, help='Print results')
+    parser.add_argument('--mmap', type=bool, default=False, help='Count the dynamic trace with the memory mapped counter')
+    parser.add_argument('--jobs', type=int, default=1, help='count of files processed in parallel')
+    parser.add_argument('--overlap', type=bool, default=False, help='Select the instructions greedily, counting each matched instruction once')
+    parser.add_argument('--exact', type=bool, default=False, help='Select the instructions of all widths together by branch and bound, counting each matched instruction once')
+    parser.add_argument('--time-limit', type=float, default=60, help='seconds after which --exact stops with the best selection found')
+    parser.add_argument('--window', type=int, default=0, help='Propose also the repeated dataflow connected windows of up to this many instructions')
+    parser.add_argument('--workers', type=int, default=1, help='count of configurations of width and imm mode processed in parallel per file')
+    parser.add_argument('--cache', type=bool, default=False, help='Load parse results from the cache in ' + cache.CACHE_DIR)
     parser.add_argument('--path', type=str, help='base path for the files') 
     parser.add_argument('--debug', type=bool, help='print debug messages')
 
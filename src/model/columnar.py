@@ -0,0 +1,267 @@
+from array import array
+
+import numpy as np
+
+from model import instruction_model, immediate
+
+
+class Table:
+    '''
+    Interns values to dense integer ids.
+    '''
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def intern(self, value) -> int:
+        vid = self.ids.get(value)
+        if vid is None:
+            vid = len(self.values)
+            self.ids[value] = vid
+            self.values.append(value)
+        return vid
+
+    def remap(self, other: 'Table') -> np.ndarray:
+        'interns all values of `other` and returns the array mapping its ids to the ids of this table'
+        return np.array([self.intern(value) for value in other.values], dtype=np.int32)
+
+
+class InstructionView(instruction_model.Instruction):
+    '''
+    An `Instruction` stored in row `index` of a `ColumnarProgram`.
+
+    The fields are read from the columns on access, all methods of `Instruction` work on views.
+    Views are read only.
+    '''
+    __slots__ = ('program', 'index')
+
+    def __init__(self, program: 'ColumnarProgram', index: int):
+        self.program = program
+        self.index = index
+
+    @property
+    def address(self) -> str:
+        return self.program.addresses.values[self.program.address_ids[self.index]]
+
+    @property
+    def opcode(self) -> str:
+        return self.program.opcodes.values[self.program.opcode_ids[self.index]]
+
+    @property
+    def mnemonic(self) -> str:
+        return self.program.mnemonics.values[self.program.mnemonic_ids[self.index]]
+
+    @property
+    def regs(self) -> list:
+        program = self.program
+        start = program.reg_offsets[self.index]
+        end = program.reg_offsets[self.index + 1]
+        return [program.regs.values[rid] for rid in program.reg_ids[start:end]]
+
+    @property
+    def imm(self) -> immediate.Imm:
+        if not self.program.has_imms[self.index]:
+            return None
+        return immediate.Imm(int(self.program.imms[self.index]))
+
+    @property
+    def branch_target(self):
+        tid = self.program.target_ids[self.index]
+        if tid < 0:
+            return None
+        return self.program.targets.values[tid]
+
+    @property
+    def info(self) -> instruction_model.MnemonicInfo:
+        return instruction_model.get_mnemonic_info(self.mnemonic)
+
+    @property
+    def size(self) -> int:
+        return self.get_size()
+
+    @property
+    def address_value(self) -> int:
+        return self.get_address()
+
+    def get_size(self) -> int:
+        return int(self.program.opcode_sizes[self.program.opcode_ids[self.index]])
+
+    def get_address(self) -> int:
+        return int(self.program.address_values[self.program.address_ids[self.index]])
+
+
+class ColumnarProgram:
+    '''
+    A program stored as columns of integers instead of a list of `Instruction` objects.
+
+    Mnemonics, opcodes, addresses, registers and branch targets are interned into tables,
+    the rows only store their ids. Opcodes and addresses are interned by their text, as
+    the parsers produce hex, binary and `0x` prefixed representations and the views return
+    the original text; their count is bounded by the size of the static program.
+    The registers of row `i` are `reg_ids[reg_offsets[i]:reg_offsets[i+1]]`.
+
+    Indexing returns an `InstructionView`, slicing a `ColumnarProgram` that shares the
+    columns, so the functions of `evaluator` and `generator` can be used on it.
+    '''
+    def __init__(self):
+        self.mnemonics = Table()
+        self.opcodes = Table()
+        self.addresses = Table()
+        self.regs = Table()
+        self.targets = Table()
+        # per table entry
+        self.opcode_sizes = np.zeros(0, dtype=np.uint8)
+        self.address_values = np.zeros(0, dtype=np.uint64)
+        # per row
+        self.mnemonic_ids = np.zeros(0, dtype=np.int32)
+        self.opcode_ids = np.zeros(0, dtype=np.int32)
+        self.address_ids = np.zeros(0, dtype=np.int32)
+        self.imms = np.zeros(0, dtype=np.int64)
+        self.has_imms = np.zeros(0, dtype=np.bool_)
+        self.target_ids = np.zeros(0, dtype=np.int32)
+        self.reg_offsets = np.zeros(1, dtype=np.int64)
+        self.reg_ids = np.zeros(0, dtype=np.int16)
+
+    def __len__(self) -> int:
+        return len(self.mnemonic_ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            assert step == 1, 'only contiguous slices are supported'
+            stop = max(start, stop)
+            result = self.with_columns(lambda col: col[start:stop])
+            result.reg_offsets = self.reg_offsets[start:stop + 1]
+            return result
+        if key < 0:
+            key += len(self)
+        if key < 0 or key >= len(self):
+            raise IndexError('instruction index out of range')
+        return InstructionView(self, key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield InstructionView(self, i)
+
+    def with_columns(self, select) -> 'ColumnarProgram':
+        'returns a program sharing the tables of this program, with the row columns passed through `select`'
+        result = ColumnarProgram.__new__(ColumnarProgram)
+        result.__dict__.update(self.__dict__)
+        for name in ['mnemonic_ids', 'opcode_ids', 'address_ids', 'imms', 'has_imms', 'target_ids']:
+            setattr(result, name, select(getattr(self, name)))
+        return result
+
+    def get_sizes(self) -> np.ndarray:
+        return self.opcode_sizes[self.opcode_ids]
+
+    def get_addresses(self) -> np.ndarray:
+        return self.address_values[self.address_ids]
+
+    def get_byte_count(self) -> int:
+        return int(self.get_sizes().sum(dtype=np.int64))
+
+    @staticmethod
+    def from_instructions(instructions) -> 'ColumnarProgram':
+        '''
+        Builds a program from an iterable of instructions.
+
+        The columns are collected in compact arrays, so a generator like
+        `parse_utils.iter_instructions` never holds more than one `Instruction`.
+        '''
+        program = ColumnarProgram()
+        mnemonic_ids = array('i')
+        opcode_ids = array('i')
+        address_ids = array('i')
+        imms = array('q')
+        has_imms = array('b')
+        target_ids = array('i')
+        reg_offsets = array('q', [0])
+        reg_ids = array('h')
+        opcode_sizes = []
+        address_values = []
+
+        for inst in instructions:
+            mnemonic_ids.append(program.mnemonics.intern(inst.mnemonic))
+
+            oid = program.opcodes.intern(inst.opcode)
+            if oid == len(opcode_sizes):
+                opcode_sizes.append(inst.get_size())
+            opcode_ids.append(oid)
+
+            aid = program.addresses.intern(inst.address)
+            if aid == len(address_values):
+                address_values.append(int(inst.address, 16))
+            address_ids.append(aid)
+
+            imm = inst.imm
+            imms.append(0 if imm is None else imm.value)
+            has_imms.append(imm is not None)
+
+            target = inst.branch_target
+            target_ids.append(-1 if target is None else program.targets.intern(target))
+
+            for reg in inst.regs:
+                reg_ids.append(program.regs.intern(reg))
+            reg_offsets.append(len(reg_ids))
+
+        program.mnemonic_ids = np.frombuffer(mnemonic_ids, dtype=np.int32)
+        program.opcode_ids = np.frombuffer(opcode_ids, dtype=np.int32)
+        program.address_ids = np.frombuffer(address_ids, dtype=np.int32)
+        program.imms = np.frombuffer(imms, dtype=np.int64)
+        program.has_imms = np.frombuffer(has_imms, dtype=np.int8).astype(np.bool_)
+        program.target_ids = np.frombuffer(target_ids, dtype=np.int32)
+        program.reg_offsets = np.frombuffer(reg_offsets, dtype=np.int64)
+        program.reg_ids = np.frombuffer(reg_ids, dtype=np.int16)
+        program.opcode_sizes = np.array(opcode_sizes, dtype=np.uint8)
+        program.address_values = np.array(address_values, dtype=np.uint64)
+        return program
+
+    @staticmethod
+    def concat(programs: list['ColumnarProgram']) -> 'ColumnarProgram':
+        'returns the program of all rows of `programs`, their ids are remapped to common tables'
+        result = ColumnarProgram()
+        columns = {name: [] for name in ['mnemonic_ids', 'opcode_ids', 'address_ids', 'imms', 'has_imms', 'target_ids', 'reg_ids']}
+        reg_offsets = [np.zeros(1, dtype=np.int64)]
+        reg_count = 0
+        opcode_sizes = np.zeros(0, dtype=np.uint8)
+        address_values = np.zeros(0, dtype=np.uint64)
+
+        for program in programs:
+            mnemonic_map = result.mnemonics.remap(program.mnemonics)
+            opcode_map = result.opcodes.remap(program.opcodes)
+            address_map = result.addresses.remap(program.addresses)
+            reg_map = result.regs.remap(program.regs)
+            target_map = np.append(result.targets.remap(program.targets), np.int32(-1))
+
+            sizes = np.zeros(len(result.opcodes), dtype=np.uint8)
+            sizes[:len(opcode_sizes)] = opcode_sizes
+            sizes[opcode_map] = program.opcode_sizes
+            opcode_sizes = sizes
+            values = np.zeros(len(result.addresses), dtype=np.uint64)
+            values[:len(address_values)] = address_values
+            values[address_map] = program.address_values
+            address_values = values
+
+            first = program.reg_offsets[0]
+            last = program.reg_offsets[-1]
+            columns['mnemonic_ids'].append(mnemonic_map[program.mnemonic_ids])
+            columns['opcode_ids'].append(opcode_map[program.opcode_ids])
+            columns['address_ids'].append(address_map[program.address_ids])
+            columns['imms'].append(program.imms)
+            columns['has_imms'].append(program.has_imms)
+            # -1 selects the last entry of target_map, which is -1 again
+            columns['target_ids'].append(target_map[program.target_ids])
+            columns['reg_ids'].append(reg_map[program.reg_ids[first:last]].astype(np.int16))
+            reg_offsets.append(program.reg_offsets[1:] - first + reg_count)
+            reg_count += last - first
+
+        for name, parts in columns.items():
+            if len(parts) > 0:
+                setattr(result, name, np.concatenate(parts).astype(getattr(result, name).dtype))
+        result.reg_offsets = np.concatenate(reg_offsets).astype(np.int64)
+        result.opcode_sizes = opcode_sizes
+        result.address_values = address_values
+        return result
@@ -5,7 +5,8 @@ import re
 
 
 class Imm:
-    value: int = 0
+    __slots__ = ('value',)
+    value: int
 
     def __init__(self, value: int):
         self.value = value
@@ -26,8 +27,11 @@ class Imm:
         return Array(format, self.value)
 
 
+HEX_PATTERN = re.compile(r"^[0x]*[0-9a-fA-F]+$")
+
+
 def is_hex(s):
-    return re.fullmatch(r"^[0x]*[0-9a-fA-F]+$", s or "") is not None
+    return HEX_PATTERN.fullmatch(s or "") is not None
 
 def is_integer_num(n) -> bool:
     if isinstance(n, int):
@@ -58,6 +62,10 @@ def to_imm(val: str) -> Tuple[bool, Imm]:
     if vlen == 1:
         if val[:2] == '0x' or val[:3] == '-0x':
             return (True, Imm(int(val, 16)))
+        # decimal, checked without the regex of `is_integer_num`
+        digits = val[1:] if val[:1] == '-' else val
+        if digits.isascii() and digits.isdecimal():
+            return (True, Imm(int(val)))
         if is_integer_num(val):
             return (True, Imm(int(val)))
         
@@ -1,3 +1,5 @@
+import sys
+
 from model import register, immediate
 
 store = [
@@ -43,23 +45,89 @@ branch = [
     'bleu', 'bgeu'
 ]
 
+# branches without a fall-through to the next instruction
+jump = ['j', 'jr', 'ret', 'tail']
+
+branch_set = frozenset(branch)
+jump_set = frozenset(jump)
+load_set = frozenset(load)
+store_set = frozenset(store)
+
+
+class MnemonicInfo:
+    '''
+    The values derived from a mnemonic, computed once per mnemonic and shared by all its instructions.
+    '''
+    __slots__ = ('mnemonic', 'base_mnemonic', 'is_branch', 'is_load', 'is_store', 'has_no_dest', 'is_dup_compressed', 'ends_block', 'is_jump')
+
+    def __init__(self, mnemonic: str):
+        self.mnemonic = mnemonic
+        self.base_mnemonic = sys.intern(mnemonic.replace('c.', '').replace('sp', ''))
+        self.is_branch = mnemonic in branch_set
+        self.is_load = mnemonic in load_set
+        self.is_store = mnemonic in store_set
+        self.has_no_dest = mnemonic in no_dest
+        self.is_dup_compressed = mnemonic in dup_compressed
+        # compressed branches end a basic block too, so these test the base mnemonic
+        self.ends_block = self.base_mnemonic in branch_set
+        self.is_jump = self.base_mnemonic in jump_set
+
+    def __reduce__(self):
+        # unpickled instructions share the infos of this process
+        return (get_mnemonic_info, (self.mnemonic,))
+
+
+# mnemonic -> MnemonicInfo
+_mnemonic_infos: dict[str, MnemonicInfo] = {}
+
+
+def get_mnemonic_info(mnemonic: str) -> MnemonicInfo:
+    info = _mnemonic_infos.get(mnemonic)
+    if info is None:
+        info = MnemonicInfo(mnemonic)
+        _mnemonic_infos[mnemonic] = info
+    return info
+
+
+def get_opcode_size(opcode: str) -> int:
+    'returns the code size in bytes of the even length `opcode`, or None if it has no valid length'
+    if len(opcode) < 16:
+        return len(opcode) // 2
+    if len(opcode) % 16 != 0:
+        return None
+    return len(opcode) // 8
+
+
 reg_util = register.Regs()
 
 class Instruction:
-    address: str = ''
-    opcode: str = ''
-    mnemonic: str = ''
-    regs: list[register.Reg] = []
-    imm: immediate.Imm = None
-    branch_target = None
+    __slots__ = ('address', 'opcode', 'mnemonic', 'regs', 'imm', 'branch_target', 'address_value', 'size', 'info')
+    address: str
+    opcode: str
+    mnemonic: str
+    regs: list[register.Reg]
+    imm: immediate.Imm
+    branch_target: str
+    # the values derived from the fields, computed once at construction
+    # `int(address, 16)`
+    address_value: int
+    # `get_opcode_size(opcode)`
+    size: int
+    info: MnemonicInfo
 
     def __init__(self, address: str, opcode: str, mnemonic: str):
         if len(opcode) % 2 != 0:
             opcode = '0' + opcode
         self.address = address
         self.opcode = opcode
-        self.mnemonic = mnemonic
+        # mnemonics repeat in every trace, all instructions share the interned string
+        self.mnemonic = sys.intern(mnemonic)
         self.regs = []
+        self.imm = None
+        self.branch_target = None
+        self.address_value = int(address, 16)
+        self.size = get_opcode_size(opcode)
+        self.info = get_mnemonic_info(self.mnemonic)
 
     def __str__(self) -> str:
         shift = 32
@@ -79,7 +147,7 @@ class Instruction:
     def append_param(self, param: str):
         is_reg, reg = reg_util.get_reg(param)
         
-        if self.mnemonic in branch: 
+        if self.info.ends_block and param[0:2] == '0x':
             self.branch_target = param
         if is_reg:
             self.regs.append(reg)
@@ -90,18 +158,45 @@ class Instruction:
                     raise Exception('ERROR: instruction ', str(self), ' has aleready a imm imm!')
                 self.imm = imm
     
+    def append_params(self, params: list[str]):
+        '''
+        Appends all `params` like `append_param`, with the lookups hoisted out of the loop.
+
+        The branch target is the absolute address param, llvm-objdump appends the symbol after it:
+
+        >>> from tools import parse_utils
+        >>> address, opcode, mnemonic, params = parse_utils.split_objdump_line(
+        ...     '   10080: 63 0c 05 00  \\tbeqz\\ta0, 0x10098 <main+0x18>')
+        >>> inst = Instruction(address, opcode, mnemonic)
+        >>> inst.append_params(params)
+        >>> inst.branch_target
+        '0x10098'
+        '''
+        ends_block = self.info.ends_block
+        by_name = reg_util.by_name
+        for param in params:
+            reg = by_name.get(param)
+            if reg is not None:
+                self.regs.append(reg)
+                continue
+            if ends_block and param[0:2] == '0x':
+                self.branch_target = param
+            is_imm, imm = immediate.to_imm(param)
+            if is_imm:
+                if self.imm != None:
+                    raise Exception('ERROR: instruction ', str(self), ' has aleready a imm imm!')
+                self.imm = imm
+    
     def get_size(self) -> int:
         'retruns the instruction code size in bytes'
-        assert len(self.opcode) % 2 == 0
-        if len(self.opcode) < 16:
-            return int(len(self.opcode)/2)
-        assert len(self.opcode) % 16 == 0
-        return int(len(self.opcode)/8)
+        assert self.size is not None
+        return self.size
     
     def get_params(self) -> list[register.Reg]:
-        if self.mnemonic in no_dest:
+        info = self.info
+        if info.has_no_dest:
             return self.regs
-        if self.mnemonic in dup_compressed:
+        if info.is_dup_compressed:
             return self.regs
         return self.regs[1:]
     
@@ -111,13 +206,13 @@ class Instruction:
         return self.regs[0]
     
     def has_dest(self) -> bool:
-        return not (self.mnemonic in no_dest or len(self.regs) < 1)
+        return not (self.info.has_no_dest or len(self.regs) < 1)
 
     def has_imm(self) -> bool:
         return self.imm != None
     
     def get_address(self) -> int:
-        return int(self.address, 16)
+        return self.address_value
 
     def get_imm(self) -> immediate.Imm:
         # if not self.has_imm() or type(self.imm) != immediate.Imm:
@@ -125,13 +220,19 @@ class Instruction:
         return self.imm
     
     def get_base_mnemonic(self) -> str:
-        return str(self.mnemonic) \
-            .replace('c.', '') \
-            .replace('sp', '')
+        return self.info.base_mnemonic
+    
+    def is_branch(self) -> bool:
+        return self.info.is_branch
+    
+    def is_load(self) -> bool:
+        return self.info.is_load
+    
+    def is_store(self) -> bool:
+        return self.info.is_store
     
     def is_compressed(self) -> bool:
         return self.get_size() == 2
     
     def is_48_inst(self) -> bool:
         return self.get_size() == 6
-    
\ No newline at end of file
@@ -1,7 +1,86 @@
 from model import instruction_model
 
+
+def get_target_address(target: str) -> int:
+    'returns the address of the branch `target`, or None if it is no absolute address like `0x10c`'
+    if target is None or not target.startswith('0x'):
+        return None
+    try:
+        return int(target, 16)
+    except ValueError:
+        return None
+
+
+class BasicBlocks:
+    '''
+    The basic blocks of a program, computed once and shared by all analyses.
+
+    A block ends after each instruction with a branch base mnemonic, `branches` tells by position
+    if an instruction ends a block. The pattern generation, mining and matching all split there
+    only, so a known branch target does not start a block and may lie inside one.
+    Block `b` spans the positions `starts[b]` up to `ends[b]` (exclusive), `successors[b]` are
+    the addresses it continues at: the branch target if it is known and the next instruction
+    unless the block ends with a jump.
+    Iterating yields the `(start, end)` of each block, so blocks can be processed independently.
+
+    `counts` are the counts of the instructions executed in each block, once `set_exec_counts`
+    is called with the execution counts of a trace, a block with count 0 was never entered.
+
+    >>> from tools import parse_utils
+    >>> def parse(line):
+    ...     address, opcode, mnemonic, params = parse_utils.split_objdump_line(line)
+    ...     inst = instruction_model.Instruction(address, opcode, mnemonic)
+    ...     inst.append_params(params)
+    ...     return inst
+    >>> blocks = BasicBlocks([
+    ...     parse('   10080: 63 0c 05 00  \\tbeqz\\ta0, 0x10098 <main+0x18>'),
+    ...     parse('   10084: 13 05 15 00  \\taddi\\ta0, a0, 0x1'),
+    ... ])
+    >>> list(blocks), [[hex(addr) for addr in succ] for succ in blocks.successors]
+    ([(0, 1), (1, 2)], [['0x10098', '0x10084'], []])
+    >>> blocks.set_exec_counts([3, 0])
+    >>> blocks.counts
+    [3, 0]
+    '''
+    def __init__(self, instructions: list[instruction_model.Instruction]):
+        self.branches = [inst.info.ends_block for inst in instructions]
+        inst_len = len(instructions)
+
+        targets = [
+            get_target_address(inst.branch_target) if branch else None
+            for inst, branch in zip(instructions, self.branches)
+        ]
+        self.starts = [0] if inst_len > 0 else []
+        for i in range(inst_len - 1):
+            if self.branches[i]:
+                self.starts.append(i + 1)
+        self.ends = self.starts[1:] + [inst_len] if inst_len > 0 else []
+        self.successors = []
+        for end in self.ends:
+            last = instructions[end - 1]
+            successors = []
+            if self.branches[end - 1] and targets[end - 1] is not None:
+                successors.append(targets[end - 1])
+            if end < inst_len and not last.info.is_jump:
+                successors.append(instructions[end].address_value)
+            self.successors.append(successors)
+        self.counts = None
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def set_exec_counts(self, exec_counts: list[int]):
+        'sets the `counts` from the execution count of each instruction by position'
+        self.counts = [sum(exec_counts[start:end]) for start, end in self]
+
+
 class Program:
     instructions: list[instruction_model.Instruction]
+    # the `BasicBlocks` of the instructions, built on the first `get_blocks`
+    blocks: BasicBlocks = None
     
     def __init__(self):
         self.instructions = []
@@ -13,5 +92,8 @@ class Program:
         for inst in self.instructions:
             print(inst)
             
-        
-    
\ No newline at end of file
+    def get_blocks(self) -> BasicBlocks:
+        'returns the basic blocks of the instructions, computed once per program'
+        if self.blocks is None:
+            self.blocks = BasicBlocks(self.instructions)
+        return self.blocks
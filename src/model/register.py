@@ -9,9 +9,21 @@ class SavedBy(Enum):
     CALLEE = 'E'
 
 
+# The registers of the first `Regs` by their first name, shared by all instructions
+_shared: dict[str, 'Reg'] = {}
+
+
+def _restore_reg(names: list[str], saved_by: SavedBy) -> 'Reg':
+    reg = _shared.get(names[0])
+    if reg is None or reg.names != names:
+        reg = Reg(names, saved_by)
+    return reg
+
+
 class Reg:
-    names: list[str] = []
-    saved_by: SavedBy = None
+    __slots__ = ('names', 'saved_by')
+    names: list[str]
+    saved_by: SavedBy
 
     def __init__(self, names: list[str], saved_by: SavedBy):
         self.names = names
@@ -27,11 +39,22 @@ class Reg:
             return other in self.names
         return self.names == other.names
 
+    def __reduce__(self):
+        # Registers are compared by identity, so unpickled instructions (e.g. parsed by 
+        # a worker process) have to reference the registers of this process.
+        return (_restore_reg, (self.names, self.saved_by))
+
 
 class Regs:
     all: list[Reg] = []
     reduced_regs: list[Reg] = []
     fregs: list[Reg] = []
+    # name -> Reg, built once by `__init__`
+    by_name: dict[str, Reg] = {}
+    reduced_by_name: dict[str, Reg] = {}
+    # name -> index in the register file, built once by `__init__`
+    index_by_name: dict[str, int] = {}
+    reduced_index_by_name: dict[str, int] = {}
 
     # encoded in 5 bits
     def __init__(self):
@@ -110,15 +133,42 @@ class Regs:
         self.reduced_regs = self.all[8:16]
         assert len(self.all) == 32
         assert len(self.reduced_regs) == 8
+        for reg in self.all + self.fregs:
+            _shared.setdefault(reg.names[0], reg)
+
+        self.by_name = self.index(self.all + self.fregs)
+        self.reduced_by_name = self.index(self.reduced_regs)
+        # FP registers are encoded by their f number, `fregs` starts with the FP zero
+        self.index_by_name = self.index_positions(self.fregs[1:])
+        self.index_by_name.update(self.index_positions(self.all))
+        # objdump prints x0 as `zero`, the name of the FP zero in `fregs`
+        self.index_by_name['zero'] = 0
+        self.reduced_index_by_name = self.index_positions(self.reduced_regs)
+
+    @staticmethod
+    def index(regs: list[Reg]) -> dict[str, Reg]:
+        'maps every name to the first register in `regs` with that name'
+        result = {}
+        for reg in regs:
+            for name in reg.names:
+                result.setdefault(name, reg)
+        return result
+
+    @staticmethod
+    def index_positions(regs: list[Reg]) -> dict[str, int]:
+        'maps every name to the position of the first register in `regs` with that name'
+        result = {}
+        for position, reg in enumerate(regs):
+            for name in reg.names:
+                result.setdefault(name, position)
+        return result
 
     def get_reg(self, name: str, compressed_reg:bool=False) -> Tuple[bool, Reg]:
-        regs = self.all + self.fregs
+        regs = self.by_name
         if compressed_reg:
-            regs = self.reduced_regs
-        for reg in regs:
-            if name in reg.names:
-                return (True, reg)
-        return (False, None)
+            regs = self.reduced_by_name
+        reg = regs.get(name)
+        return (reg is not None, reg)
 
     def get_all(self) -> list[Reg]:
         return self.all
@@ -137,8 +187,43 @@ class Regs:
     def get_reg_only(self, name:str, compressed_reg:bool=False) -> Reg:
         return self.get_reg(name, compressed_reg)[0]
     
+    def get_index_reg(self, name: str, compressed_reg:bool=False) -> Tuple[int, Reg]:
+        'returns the index of the register `name` in its register file and the register, or -1 and None'
+        indices = self.index_by_name
+        if compressed_reg:
+            indices = self.reduced_index_by_name
+        index = indices.get(name, -1)
+        if index < 0:
+            return (-1, None)
+        return (index, self.get_reg(name, compressed_reg)[1])
+
     def get_coding(self, name, compressed_reg=False) -> Array:
-        index, _ = self.get_index_reg(name)
+        index, _ = self.get_index_reg(name, compressed_reg)
         assert index >= 0
         format = f'uint{self.get_width(compressed_reg)}'
-        return Array(format, index)
+        return Array(format, [index])
+
+    def get_codings(self, names: list[str], compressed_reg:bool=False) -> int:
+        '''
+        Returns the indices of the registers `names` packed into one int, the first register
+        in the most significant bits, as the concatenation of their `get_coding`.
+
+        >>> regs = Regs()
+        >>> regs.get_index_reg('zero')[0], regs.get_index_reg('f0')[0], regs.get_index_reg('f31')[0]
+        (0, 0, 31)
+        >>> regs.get_codings(['zero', 'ra', 'f31']) == (0 << 10) | (1 << 5) | 31
+        True
+        >>> regs.get_codings(['s0', 'a5'], compressed_reg=True)
+        7
+        '''
+        indices = self.index_by_name
+        if compressed_reg:
+            indices = self.reduced_index_by_name
+        width = self.get_width(compressed_reg)
+        result = 0
+        for name in names:
+            index = indices.get(str(name), -1)
+            assert index >= 0, f'{name} is no register'
+            assert index < 1 << width, f'{name} does not fit in {width} bits'
+            result = (result << width) | index
+        return result
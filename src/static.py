@@ -5,7 +5,7 @@ import string
 import generator
 
 from model import instruction_model, program
-from tools import parse_utils, evaluator, modes, plotter
+from tools import analysis, cache, parse_utils, evaluator, modes, plotter
 
 # Debug logs (very verbose)
 debug = False
@@ -121,51 +121,21 @@ def parse_line(source_line: str, ignore) -> instruction_model.Instruction:
       in the context where this function is executed.
     '''
     
-    if source_line[0:1] == ' ' or source_line[0:1] in string.hexdigits:
-        elems: list[str] = source_line.strip() \
-            .replace('    ', ' ~ ') \
-            .replace('\t', ' ') \
-            .replace('  ', ' ') \
-            .replace('  ', ' ') \
-            .replace('  ', ' ') \
-            .replace(',', '') \
-            .replace(':', '') \
-            .replace(')', '') \
-            .replace('{', '') \
-            .replace('}', '') \
-            .replace('(', ' ') \
-            .split(' ')
-        elen = len(elems)
-        if elen >= 6:
-            mn_index = 5
-            if elen > 8 and elems[8][0:2] == 'k.':
-                mn_index = 8
-            
-            opcode = elems[1]
-            oplen = len(opcode)
-            if oplen >= 4:
-                mn_index = 4
-                if oplen == 8:
-                    mn_index = 3
-                    
-            else:
-                op_elems = elems[1:mn_index]
-                op_elems.reverse()
-                opcode = ''.join(op_elems).replace('~', '')
-                
-            instruction = instruction_model.Instruction(
-                address=elems[0], 
-                opcode=opcode, 
-                mnemonic=elems[mn_index]
-            )
-            if instruction.get_base_mnemonic() in ignore['mnemonic']:
-                return None
-
-            for elem in elems[(mn_index+1):]:
-                instruction.append_param(elem)
-            
-            # print("Parsed inst:", instruction)
-            return instruction
+    elems = parse_utils.split_objdump_line(source_line)
+    if elems is not None:
+        address, opcode, mnemonic, params = elems
+        instruction = instruction_model.Instruction(
+            address=address, 
+            opcode=opcode, 
+            mnemonic=mnemonic
+        )
+        if instruction.get_base_mnemonic() in ignore['mnemonic']:
+            return None
+
+        instruction.append_params(params)
+        
+        # print("Parsed inst:", instruction)
+        return instruction
     return None
 
 
@@ -182,6 +152,8 @@ def main(args):
                                 It must have at least the following attributes:
                                 - path: The base path where the asm files are located.
                                 - files: An iterable with the names of the asm to be processed.
+                                - jobs: The count of files parsed in parallel.
+                                - cache: Load the parsed files from the cache.
 
     '''
     
@@ -192,14 +164,17 @@ def main(args):
     path = str(Path(args.path).absolute())
     tp = 'Static'
     total = []
-    for file in args.files:
+    fqpns = [
+        '{}/{}'.format(str(path), str(file))
+        for file in args.files
+    ]
+    parse = cache.bind(parse_utils.parse_file, args.cache, parse_line=parse_line, ignore=ign)
+    programs = parse_utils.map_files(parse, fqpns, args.jobs)
+    for file, fqpn, program in zip(args.files, fqpns, programs):
         if debug:
             print('Base Path: ', path)
             print('File to analyze: ', file)
 
-
-        fqpn = '{}/{}'.format(str(path), str(file))
-        program: program.Program = parse_utils.parse_file(fqpn, parse_line, ign)
         if len(program.instructions) > 0:
             total += program.instructions
             if plot_all:
@@ -209,68 +184,70 @@ def main(args):
             print('ERROR: No instructions in', fqpn)
     
     if len(total) > 1:
-        evaluator.print_total_static_improvement(total)
+        # all statistics of the total are computed in one traversal
+        mode_stats = [
+            analysis.MostInst(mode, modes.SearchKey.MNEMONIC, 10)
+            for mode in modes.Mode
+        ]
+        lswm_stats = {
+            'c.lwm': analysis.LswmImprovement(base_isnt='lw', new_byte_count=2, base_regs=['sp', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4'], dest_regs=['ra', 'sp', 's0', 's1', 'a0', 'a1']),
+            'c.swm': analysis.LswmImprovement(base_isnt='sw', new_byte_count=2, base_regs=['sp', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4'], dest_regs=['ra', 'sp', 's0', 's1', 'a0', 'a1']),
+            'lwm': analysis.LswmImprovement(base_isnt='lw', new_byte_count=4, base_regs='all', dest_regs={'ra', 'sp', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4', 'a5', 's2', 's3', 's4', 's5', 's6', 's7'}),
+            'swm': analysis.LswmImprovement(base_isnt='sw', new_byte_count=4, base_regs='all', dest_regs={'ra', 'sp', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4', 'a5', 's2', 's3', 's4', 's5', 's6', 's7'}),
+            'e.lwm': analysis.LswmImprovement(base_isnt='lw', new_byte_count=6, base_regs='all', dest_regs='all'),
+            'e.swm': analysis.LswmImprovement(base_isnt='sw', new_byte_count=6, base_regs='all', dest_regs='all'),
+        }
+        en_stats = {
+            'e.call': analysis.EnImprovement(['auipc', 'jalr']),
+            'e.li': analysis.EnImprovement(['lui', 'addi']),
+            'e.2addi': analysis.EnImprovement(['addi', 'addi']),
+            'e.2add': analysis.EnImprovement(['add', 'add']),
+            'e.slro': analysis.EnImprovement(['srli', 'slli', 'or']),
+        }
+        byte_count = analysis.ByteCount()
+        full_stats = analysis.MostInst(modes.Mode.FULL, modes.SearchKey.MNEMONIC, 100000)
+        opcode_stats = analysis.MostInst(modes.Mode.ALL, modes.SearchKey.OPCODE, 10)
+        register_stats = analysis.MostInst(modes.Mode.ALL, modes.SearchKey.REGISTER, 10)
+        chains = analysis.LongestChains(10)
+        chain_distrib = analysis.ChainDistrib(10)
+        triplets = analysis.MostTriplets(10, equal=False, connected=True)
+        free_triplets = analysis.MostTriplets(10)
+        pairs = analysis.MostPairs(10, equal=False, connected=True)
+        free_pairs = analysis.MostPairs(10)
+        analysis.run(total, mode_stats + list(lswm_stats.values()) + list(en_stats.values()) + [
+            byte_count, full_stats, opcode_stats, register_stats, chains, chain_distrib,
+            triplets, free_triplets, pairs, free_pairs
+        ])
+        total_byte_count = byte_count.result()
+
+        evaluator.report_total_static_improvement(full_stats.result(), len(total), total_byte_count)
+        if evaluator.debug:
+            evaluator.print_debug_pairs(total)
         
-        for mode in modes.Mode:
-            stats = evaluator.most_inst(total, mode, modes.SearchKey.MNEMONIC, 10)
-            plotter.plot_bars(stats, '_Total', tp, path, mode, modes.SearchKey.MNEMONIC)
+        for mode, stats in zip(modes.Mode, mode_stats):
+            plotter.plot_bars(stats.result(), '_Total', tp, path, mode, modes.SearchKey.MNEMONIC)
 
-        stats = evaluator.most_inst(total, modes.Mode.ALL, modes.SearchKey.OPCODE, 10)
-        plotter.plot_bars(stats, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.OPCODE)
+        plotter.plot_bars(opcode_stats.result(), '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.OPCODE)
 
-        stats = evaluator.most_inst(total, modes.Mode.ALL, modes.SearchKey.REGISTER, 10)
-        plotter.plot_bars(stats, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.REGISTER)
+        plotter.plot_bars(register_stats.result(), '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.REGISTER)
         
-        chains = evaluator.longest_chains(total, 10)
-        plotter.plot_bars(chains, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.CHAIN)
+        plotter.plot_bars(chains.result(), '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.CHAIN)
 
-        chains = evaluator.chain_distrib(total, 10)
-        plotter.plot_bars(chains, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.CHAIN_DISTRIB)
+        plotter.plot_bars(chain_distrib.result(), '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.CHAIN_DISTRIB)
 
-        triplets = evaluator.most_triplets(total, 10, equal=False, connected=True)
-        plotter.plot_bars(triplets, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.TRIPLET)
+        plotter.plot_bars(triplets.result(), '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.TRIPLET)
 
-        triplets = evaluator.most_triplets(total, 10)
-        plotter.plot_bars(triplets, '_Total_Free', tp, path, modes.Mode.ALL, modes.SearchKey.TRIPLET)
-
-        lw16_imp = evaluator.get_lswm_improvement(total, base_isnt='lw', new_byte_count=2, base_regs=['sp', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4'], dest_regs=['ra', 'sp', 's0', 's1', 'a0', 'a1'])
-        sw16_imp = evaluator.get_lswm_improvement(total, base_isnt='sw', new_byte_count=2, base_regs=['sp', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4'], dest_regs=['ra', 'sp', 's0', 's1', 'a0', 'a1'])
-        
-        lw32_imp = evaluator.get_lswm_improvement(total, base_isnt='lw', new_byte_count=4, base_regs='all', dest_regs={'ra', 'sp', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4', 'a5', 's2', 's3', 's4', 's5', 's6', 's7'})
-        sw32_imp = evaluator.get_lswm_improvement(total, base_isnt='sw', new_byte_count=4, base_regs='all', dest_regs={'ra', 'sp', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4', 'a5', 's2', 's3', 's4', 's5', 's6', 's7'})
-        
-        lw48_imp = evaluator.get_lswm_improvement(total, base_isnt='lw', new_byte_count=6, base_regs='all', dest_regs='all')
-        sw48_imp = evaluator.get_lswm_improvement(total, base_isnt='sw', new_byte_count=6, base_regs='all', dest_regs='all')
-
-
-        call = evaluator.get_en_improvement(total, ['auipc', 'jalr'])
-        eli_imp = evaluator.get_en_improvement(total, ['lui', 'addi'])
-        e2addi_imp = evaluator.get_en_improvement(total, ['addi', 'addi'])
-        e2add_imp = evaluator.get_en_improvement(total, ['add', 'add'])
-        
-        e3add_imp = evaluator.get_en_improvement(total, ['srli', 'slli', 'or'])
+        plotter.plot_bars(free_triplets.result(), '_Total_Free', tp, path, modes.Mode.ALL, modes.SearchKey.TRIPLET)
 
-        total_byte_count = evaluator.get_byte_count(total)
         imp = [
-            ('e.call', evaluator.rel(call, total_byte_count)),
-            ('e.li', evaluator.rel(eli_imp, total_byte_count)),
-            ('e.2addi', evaluator.rel(e2addi_imp, total_byte_count)),
-            ('e.2add', evaluator.rel(e2add_imp, total_byte_count)),
-            ('e.slro', evaluator.rel(e3add_imp, total_byte_count)),
-            ('c.lwm', evaluator.rel(lw16_imp, total_byte_count)),
-            ('c.swm', evaluator.rel(sw16_imp, total_byte_count)),
-            ('lwm', evaluator.rel(lw32_imp, total_byte_count)),
-            ('swm', evaluator.rel(sw32_imp, total_byte_count)),
-            ('e.lwm', evaluator.rel(lw48_imp, total_byte_count)),
-            ('e.swm', evaluator.rel(sw48_imp, total_byte_count)),
+            (name, evaluator.rel(stat.result(), total_byte_count))
+            for name, stat in list(en_stats.items()) + list(lswm_stats.items())
         ]
         plotter.plot_bars(imp, '_Total_LSWM_IMP', tp, path, modes.Mode.ALL, modes.SearchKey.MNEMONIC)
 
-        pairs = evaluator.most_pairs(total, 10, equal=False, connected=True)
-        plotter.plot_bars(pairs, '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.PAIR)
+        plotter.plot_bars(pairs.result(), '_Total', tp, path, modes.Mode.ALL, modes.SearchKey.PAIR)
 
-        pairs = evaluator.most_pairs(total, 10)
-        plotter.plot_bars(pairs, '_Total_Free', tp, path, modes.Mode.ALL, modes.SearchKey.PAIR)
+        plotter.plot_bars(free_pairs.result(), '_Total_Free', tp, path, modes.Mode.ALL, modes.SearchKey.PAIR)
 
     else:
         print('ERROR: In total no instructions')
@@ -280,5 +257,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Count the instructions in an assembly file.')
     parser.add_argument('files', metavar='F', type=str, nargs='+', help='files to analyze')
     parser.add_argument('--path', type=str, help='base path for the files')
+    parser.add_argument('--jobs', type=int, default=1, help='count of files parsed in parallel')
+    parser.add_argument('--cache', type=bool, default=False, help='Load parsed files from the cache in ' + cache.CACHE_DIR)
 
     main(parser.parse_args())
@@ -4,15 +4,13 @@ import matplotlib.pyplot as plt
 import numpy as np
 import tikzplotlib
 
+from tools import ranking
+
 # use latex for font rendering
 mpl.rcParams['text.usetex'] = True
 
 def sort_dict(d, threshold):
-    vals = [
-        val 
-        for val in d.items()
-    ]
-    return sorted(vals, key=lambda x:x[0], reverse=False)[:threshold]
+    return ranking.top_k(d.items(), threshold, key=lambda x:x[0], largest=False)
 
 def plot_val(base, val, name, color):
     # Plot static data
@@ -0,0 +1,338 @@
+from collections import deque
+
+from tools import modes, ranking
+
+SIZE_MODES = {
+    modes.Mode.COMPRESSED: 2,
+    modes.Mode.FULL: 4
+}
+
+
+def add_cnt(result: dict, key, cnt=1):
+    'adds `cnt` to the count of `key` in `result`'
+    if key in result:
+        result[key] += cnt
+    else:
+        result[key] = cnt
+
+
+def add_chain(chains: dict, key, chain_len: int):
+    'keeps the longest `chain_len` of the mnemonic `key` in `chains`, a single instruction is no chain'
+    if chain_len > 1:
+        if key in chains:
+            if chains[key] < chain_len:
+                chains[key] = chain_len
+        else:
+            chains[key] = chain_len
+
+
+def is_connected(old_inst, inst) -> bool:
+    'returns if the destination of `old_inst` is a param of `inst`'
+    return old_inst.get_dest() in inst.get_params()
+
+
+class Record:
+    '''
+    The values of an instruction used by the statistics, computed once per instruction.
+    '''
+    __slots__ = ('inst', 'mnemonic', 'base_mnemonic', 'size', 'dest', 'params')
+
+    def __init__(self, inst):
+        self.inst = inst
+        self.mnemonic = inst.mnemonic
+        self.base_mnemonic = inst.get_base_mnemonic()
+        self.size = inst.get_size()
+        self.dest = inst.get_dest()
+        self.params = inst.get_params()
+
+
+def run(instructions, stats: list) -> list:
+    '''
+    Feeds all `instructions` to all `stats` in one traversal and returns their results.
+
+    Each statistic gets the record of the current instruction together with the records
+    of the two instructions before it, which are `None` at the start.
+    '''
+    vold = None
+    old = None
+    for inst in instructions:
+        new = Record(inst)
+        for stat in stats:
+            stat.add(vold, old, new)
+        vold = old
+        old = new
+    return [stat.result() for stat in stats]
+
+
+class InstCount:
+    'like `len`'
+    def __init__(self):
+        self.count = 0
+
+    def add(self, vold, old, new):
+        self.count += 1
+
+    def result(self) -> int:
+        return self.count
+
+
+class ByteCount:
+    'like `evaluator.get_byte_count`'
+    def __init__(self):
+        self.count = 0
+
+    def add(self, vold, old, new):
+        self.count += new.size
+
+    def result(self) -> int:
+        return int(self.count)
+
+
+class MostInst:
+    '''
+    The `threshold` most frequent mnemonics, opcodes or registers, by `search_key`, of the
+    instructions with the size of `mode`. Used by `evaluator.most_inst` and `histogram.Histogram`.
+    '''
+    def __init__(self, mode=modes.Mode.ALL, search_key=modes.SearchKey.MNEMONIC, threshold=10):
+        self.size = SIZE_MODES.get(mode)
+        self.search_key = search_key
+        self.threshold = threshold
+        self.counts = {}
+
+    def add(self, vold, old, new):
+        if self.size is None or new.size == self.size:
+            keys = [new.mnemonic]
+            if self.search_key == modes.SearchKey.OPCODE:
+                keys = [new.inst.opcode]
+            if self.search_key == modes.SearchKey.REGISTER:
+                keys = new.inst.regs
+            counts = self.counts
+            for key in keys:
+                add_cnt(counts, key)
+
+    def add_count(self, size: int, key, cnt: int):
+        'adds `cnt` instructions of `size` bytes with the `key` of the `search_key`'
+        if self.size is None or size == self.size:
+            add_cnt(self.counts, key, cnt)
+
+    def result(self):
+        return ranking.sort_dict(self.counts, self.threshold)
+
+
+class MostAddr:
+    'like `evaluator.most_addr`'
+    def __init__(self, threshold=10000):
+        self.threshold = threshold
+        self.counts = {}
+
+    def add(self, vold, old, new):
+        key = new.inst.address
+        if key in self.counts:
+            self.counts[key] += 1
+        else:
+            self.counts[key] = 1
+
+    def result(self):
+        return ranking.sort_dict(self.counts, self.threshold)
+
+
+class LongestChains:
+    'like `evaluator.longest_chains`, used by `histogram.Histogram` as well'
+    def __init__(self, threshold=2):
+        self.threshold = threshold
+        self.chains = {}
+        self.last_key = None
+        self.chain_len = 1
+
+    def add(self, vold, old, new):
+        key = new.mnemonic
+        if old is not None:
+            if self.last_key == key:
+                self.chain_len += 1
+            else:
+                add_chain(self.chains, self.last_key, self.chain_len)
+                self.chain_len = 1
+        self.last_key = key
+
+    def result(self):
+        return ranking.sort_dict(self.chains, self.threshold)
+
+
+class ChainDistrib:
+    'like `evaluator.chain_distrib`'
+    def __init__(self, threshold=2):
+        self.threshold = threshold
+        self.counts = {}
+        self.last_mn = None
+        self.chain_len = 1
+
+    def add(self, vold, old, new):
+        if old is None:
+            # the first instruction is compared by its full mnemonic
+            self.last_mn = new.mnemonic
+            return
+        mn = new.base_mnemonic
+        if self.last_mn == mn:
+            self.chain_len += 1
+        else:
+            if self.chain_len > 1:
+                key = self.last_mn + '_' + str(self.chain_len)
+                if key in self.counts:
+                    self.counts[key] += 1
+                else:
+                    self.counts[key] = 1
+            self.chain_len = 1
+        self.last_mn = mn
+
+    def result(self):
+        return ranking.sort_dict(self.counts, self.threshold)
+
+
+class MostPairs:
+    '''
+    The `threshold` most frequent pairs of consecutive mnemonics that are equal or connected,
+    keyed by the first mnemonic with `equal`. Used by `evaluator.most_pairs` and `histogram.Histogram`.
+    '''
+    def __init__(self, threshold=5, equal=False, connected=False):
+        self.threshold = threshold
+        self.equal = equal
+        self.connected = connected
+        self.counts = {}
+
+    def add(self, vold, old, new):
+        if old is None:
+            return
+        self.add_count(old.mnemonic, new.mnemonic, old.dest in new.params, 1)
+
+    def add_count(self, old_mn: str, new_mn: str, is_conn: bool, cnt: int):
+        'adds `cnt` pairs of `old_mn` and `new_mn`, `is_conn` if the first output is consumed by the second'
+        is_equal = self.equal or old_mn == new_mn
+        is_connected = self.connected or is_conn
+        if is_equal or is_connected:
+            key = old_mn
+            if not self.equal:
+                key = old_mn + '-' + new_mn
+            add_cnt(self.counts, key, cnt)
+
+    def result(self):
+        return ranking.sort_dict(self.counts, self.threshold)
+
+
+class MostTriplets:
+    '''
+    The `threshold` most frequent overlapping triplets of mnemonics, only the equal or connected
+    ones if requested. Used by `evaluator.most_triplets` and `histogram.Histogram`.
+    '''
+    def __init__(self, threshold=5, equal=False, connected=False):
+        self.threshold = threshold
+        self.equal = equal
+        self.connected = connected
+        self.counts = {}
+
+    def add(self, vold, old, new):
+        if vold is None:
+            return
+        is_conn = vold.dest in old.params and old.dest in new.params
+        self.add_count(vold.mnemonic, old.mnemonic, new.mnemonic, is_conn, 1)
+
+    def add_count(self, vold_mn: str, old_mn: str, new_mn: str, is_conn: bool, cnt: int):
+        'adds `cnt` triplets of the mnemonics, `is_conn` if each output is consumed by the next one'
+        is_equal = self.equal and vold_mn == old_mn and old_mn == new_mn
+        is_connected = self.connected and is_conn
+        if is_equal or is_connected or (not self.equal and not self.connected):
+            key = old_mn
+            if not self.equal:
+                key = vold_mn + '-' + old_mn + '-' + new_mn
+            add_cnt(self.counts, key, cnt)
+
+    def result(self):
+        return ranking.sort_dict(self.counts, self.threshold)
+
+
+class LswmImprovement:
+    'like `evaluator.get_lswm_improvement`'
+    def __init__(self, base_isnt: str, new_byte_count: int, base_regs, dest_regs):
+        assert new_byte_count >= 2 and new_byte_count%2 == 0
+        assert base_isnt == 'lw' or base_isnt == 'sw'
+        self.base_isnt = base_isnt
+        self.new_byte_count = new_byte_count
+        self.base_regs = base_regs
+        self.dest_regs = dest_regs
+        self.imp = 0
+        self.chain_byte_saved = 0
+        if dest_regs != 'all':
+            self.dest_regs_it = dest_regs.copy()
+
+    def add(self, vold, last, new):
+        if last is None:
+            return
+        inst = new.inst
+        mn = new.base_mnemonic
+        is_eq = last.base_mnemonic == mn
+        is_mem = mn == self.base_isnt
+
+        if self.base_regs == 'all':
+            is_base_reg = True
+            is_last_base_reg = True
+        else:
+            is_base_reg = len(inst.regs) > 1 and inst.regs[1] in self.base_regs
+            is_last_base_reg = len(last.inst.regs) > 1 and last.inst.regs[1] in self.base_regs
+
+        if self.dest_regs == 'all':
+            is_dest_reg = True
+            is_last_dest_reg = True
+        else:
+            is_dest_reg = len(inst.regs) > 0 and inst.regs[0] in self.dest_regs_it
+            is_last_dest_reg = len(last.inst.regs) > 0 and last.inst.regs[0] in self.dest_regs_it
+
+        is_mem_pair = (is_eq
+                       and is_mem
+                       and is_base_reg
+                       and is_last_base_reg
+                       and is_dest_reg
+                       and is_last_dest_reg
+                       and abs(abs(inst.get_imm().value) - abs(last.inst.get_imm().value)) == 4
+                       and inst.regs[0] != last.inst.regs[0])
+        if is_mem_pair:
+            # chain detected
+            if self.chain_byte_saved == 0:
+                self.chain_byte_saved += last.size - self.new_byte_count
+                if self.dest_regs != 'all':
+                    self.dest_regs_it.remove(last.inst.regs[0])
+            self.chain_byte_saved += new.size
+            if self.dest_regs != 'all':
+                self.dest_regs_it.remove(inst.regs[0])
+        else:
+            # chain finished
+            if self.chain_byte_saved > 0:
+                self.imp += self.chain_byte_saved
+            self.chain_byte_saved = 0
+            if self.dest_regs != 'all':
+                self.dest_regs_it = self.dest_regs.copy()
+
+    def result(self) -> int:
+        return self.imp
+
+
+class EnImprovement:
+    'like `evaluator.get_en_improvement`'
+    def __init__(self, mns):
+        assert(len(mns) > 0)
+        self.mns = mns
+        self.window = deque(maxlen=len(mns))
+        self.imp = 0
+
+    def add(self, vold, old, new):
+        new_byte_count = 6 # 48 bit == 6 Byte
+        self.window.append(new)
+        if len(self.window) == len(self.mns):
+            is_eq = True
+            for record, mn in zip(self.window, self.mns):
+                is_eq = is_eq and record.base_mnemonic == mn
+            if is_eq:
+                saved = sum([record.size for record in self.window]) - new_byte_count
+                if saved > 0:
+                    self.imp += saved
+
+    def result(self) -> int:
+        return self.imp
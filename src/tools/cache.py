@@ -0,0 +1,103 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from functools import partial
+
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'rot')
+# Least recently used entries are removed when the cache grows beyond this size
+MAX_CACHE_BYTES = 4 << 30
+# Increment when a parser changes its results, this invalidates all entries
+PARSER_VERSION = 5
+
+ENTRY_SUFFIX = '.pkl'
+
+
+def describe(value) -> str:
+    'returns a description of `value`, that is stable across processes'
+    if callable(value):
+        return value.__module__ + '.' + value.__qualname__
+    if isinstance(value, np.ndarray):
+        return 'ndarray(' + str(value.dtype) + ', ' + hashlib.sha1(value.tobytes()).hexdigest() + ')'
+    if isinstance(value, dict):
+        return '{' + ', '.join(describe(key) + ': ' + describe(value[key]) for key in value) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(describe(elem) for elem in value) + ']'
+    return repr(value)
+
+
+def get_key(fqfn, func, params) -> str:
+    '''
+    Returns the cache key of `func(fqfn, **params)`.
+
+    The key changes with the path, size and modification time of the file,
+    the function, its parameters and the `PARSER_VERSION`.
+    '''
+    stat = os.stat(fqfn)
+    key = describe([
+        os.path.abspath(fqfn), stat.st_size, stat.st_mtime_ns,
+        func, sorted(params.items()), PARSER_VERSION
+    ])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    'removes the least recently used entries until the cache is not larger than `max_bytes`'
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(ENTRY_SUFFIX):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+    total = sum(entry[1] for entry in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            # removed by a concurrent run
+            pass
+        total -= size
+
+
+def cached(fqfn, func, cache_dir=CACHE_DIR, **params):
+    '''
+    Returns `func(fqfn, **params)` and stores the result in the cache.
+
+    As long as the file and the parameters do not change, following calls 
+    load the pickled result instead of calling `func`. Entries that cannot be
+    read are treated like missing ones.
+    '''
+    entry = os.path.join(cache_dir, get_key(fqfn, func, params) + ENTRY_SUFFIX)
+    try:
+        with open(entry, 'rb') as file:
+            result = pickle.load(file)
+        # mark the entry as recently used
+        os.utime(entry)
+        return result
+    except (OSError, pickle.UnpicklingError, EOFError):
+        # a missing, unreadable or truncated entry is parsed again and overwritten,
+        # entries of an outdated layout are never loaded as `PARSER_VERSION` changes
+        pass
+    
+    result = func(fqfn, **params)
+    os.makedirs(cache_dir, exist_ok=True)
+    # write to a temporary file first, so concurrent runs never read partial entries
+    fd, tmp = tempfile.mkstemp(dir=cache_dir)
+    with os.fdopen(fd, 'wb') as file:
+        pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, entry)
+    evict(cache_dir)
+    return result
+
+
+def bind(func, use_cache: bool, **params):
+    '''
+    Returns a function of the file name that calls `func` with `params`, 
+    through the cache if `use_cache` is set.
+    '''
+    if use_cache:
+        return partial(cached, func=func, **params)
+    return partial(func, **params)
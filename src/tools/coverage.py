@@ -0,0 +1,34 @@
+import csv
+
+import numpy as np
+
+# The bounds in % reported by `evaluator.report_individual_dynamic_improvement`
+BOUNDS = [99] + list(range(90, -1, -10))
+
+
+def get_curve(counts, inst_count: int, bounds=BOUNDS) -> list[tuple[int, int]]:
+    '''
+    Returns for each bound the count of the most executed instructions that make up `bound` %
+    of the `inst_count` executed instructions, like `evaluator.get_inst_rate`.
+
+    `counts` are the execution counts of the instructions in any order. They are sorted and
+    summed up once and all bounds are looked up in the cumulative sum.
+    A bound that is never reached is covered by all instructions.
+    '''
+    counts = np.sort(np.fromiter(counts, dtype=np.int64))[::-1]
+    # same float operations as `get_inst_rate`, so the bounds are reached at the same count
+    rates = (np.cumsum(counts) / inst_count) * 100
+    found = np.minimum(np.searchsorted(rates, bounds, side='left') + 1, len(counts))
+    return [
+        (bound, int(count) if bound > 0 else 0)
+        for bound, count in zip(bounds, found)
+    ]
+
+
+def write_csv(fqfn: str, curve: list[tuple[int, int]], inst_count: int):
+    'writes the `curve` of `get_curve` with the share of the instructions to `fqfn`'
+    with open(fqfn, 'w', newline='') as file:
+        writer = csv.writer(file, delimiter=',')
+        writer.writerow(['time', 'instructions', 'share'])
+        for bound, count in curve:
+            writer.writerow([bound, count, (count/inst_count)*100])
@@ -1,35 +1,15 @@
-from tools import modes, plotter
-from model import instruction_model
+from tools import analysis, coverage, modes, ngrams, plotter, ranking
+from model import columnar, instruction_model
 
 debug = False
 
 
 def sort_dict(result, threshold):
-    vals = [
-        val 
-        for val in result.items()
-    ]
-    return sorted(vals, key=lambda x:x[1], reverse=True)[:threshold]
+    return ranking.sort_dict(result, threshold)
 
 
 def most_inst(instructions, mode=modes.Mode.ALL, search_key=modes.SearchKey.MNEMONIC, threshold=10): 
-    result = {}
-    for inst in instructions:
-        is_comp = inst.get_size() == 2 and mode == modes.Mode.COMPRESSED
-        is_full = inst.get_size() == 4 and mode == modes.Mode.FULL
-        use_all = mode == modes.Mode.ALL
-        if use_all or is_comp or is_full:
-            keys = [inst.mnemonic]
-            if search_key == modes.SearchKey.OPCODE:
-                keys = [inst.opcode]
-            if search_key == modes.SearchKey.REGISTER:
-                keys = inst.regs
-            for key in keys:
-                if key in result:
-                    result[key] += 1
-                else:
-                    result[key] = 1
-    return sort_dict(result, threshold)
+    return analysis.run(instructions, [analysis.MostInst(mode, search_key, threshold)])[0]
 
 
 def longest_chains(instructions, threshold=2):
@@ -74,50 +54,20 @@ def chain_distrib(instructions, threshold=2):
 
 
 def most_pairs(instructions, threshold=5, equal=False, connected=False):
-    result = {}
-    old_inst = instructions[0]
-    for inst in instructions[1:]:
-        old_mn = old_inst.mnemonic
-        new_mn = inst.mnemonic
-        is_equal = old_mn == new_mn or equal
-        is_connected = old_inst.get_dest() in inst.get_params() or connected
-        if is_equal or is_connected:
-            key = old_mn
-            if not equal:
-                key = old_mn + '-' + new_mn
-            if key in result:
-                result[key] += 1
-            else:
-                result[key] = 1
-        old_inst = inst
-    return sort_dict(result, threshold)
+    if isinstance(instructions, columnar.ColumnarProgram):
+        return ngrams.most_pairs(instructions, threshold, equal, connected)
+    return analysis.run(instructions, [analysis.MostPairs(threshold, equal, connected)])[0]
 
 
 def most_triplets(instructions, threshold=5, equal=False, connected=False):
     # overlapping triples
-    result = {}
-    vold_inst = instructions[0]
-    old_inst = instructions[1]
-    for inst in instructions[2:]:
-        vold_mn = vold_inst.mnemonic
-        old_mn = old_inst.mnemonic
-        new_mn = inst.mnemonic
-        is_equal = vold_mn == old_mn and old_mn == new_mn and equal
-        is_connected = vold_inst.get_dest() in old_inst.get_params() and old_inst.get_dest() in inst.get_params() and connected
-        if is_equal or is_connected or (not equal and not connected):
-            key = old_mn
-            if not equal:
-                key = vold_mn + '-' + old_mn + '-' + new_mn
-            if key in result:
-                result[key] += 1
-            else:
-                result[key] = 1
-        vold_inst = old_inst
-        old_inst = inst
-    return sort_dict(result, threshold)
+    if isinstance(instructions, columnar.ColumnarProgram):
+        return ngrams.most_triplets(instructions, threshold, equal, connected)
+    return analysis.run(instructions, [analysis.MostTriplets(threshold, equal, connected)])[0]
 
 
-def most_addr(instructions, threshold=10000): 
+def count_addr(instructions) -> dict:
+    'returns the execution count of each address'
     result = {}
     for inst in instructions:
         key = inst.address
@@ -125,7 +75,11 @@ def most_addr(instructions, threshold=10000):
             result[key] += 1
         else:
             result[key] = 1
-    return sort_dict(result, threshold)
+    return result
+
+
+def most_addr(instructions, threshold=10000): 
+    return sort_dict(count_addr(instructions), threshold)
 
 
 def inst_vals(instructions, menomic, treshold=5):
@@ -366,32 +320,38 @@ def print_individual_static_improvement(file, instructions):
 
 
 def print_total_static_improvement(total):
-    total_inst_count = len(total)
-    total_byte_count = get_byte_count(total)
+    stats = most_inst(total, modes.Mode.FULL, modes.SearchKey.MNEMONIC, 100000)
+    report_total_static_improvement(stats, len(total), get_byte_count(total))
+
+    pairs = most_pairs(total, 1, equal=False, connected=True)
+    # x contains count of 16 or 32 Bit instructions pairs
+    # x*6 is the count of Bytes saved by a reduction to 16 bit inst
+    improvement = get_improvement(pairs, lambda x: x*6)
+
+    if debug:
+        print_debug_pairs(total)
+
+
+def report_total_static_improvement(stats, total_inst_count, total_byte_count):
     if total_byte_count > 1:
         print('Total:', total_inst_count, ' insts, with', total_byte_count, 'bytes')
        
-    stats = most_inst(total, modes.Mode.FULL, modes.SearchKey.MNEMONIC, 100000)
     # x contains count of 32 Bit (4 Byte) instructions
     # x*2 is the count of Bytes saved by a reduction to 16 bit inst
     improvement = get_improvement(stats, lambda x: x*2)
     print('  Total Improvement by replacing 32 with 16 Bit inst: ' + str(improvement) + ' Byte ==', round(rel(improvement, total_byte_count)), '%')
 
-    pairs = most_pairs(total, 1, equal=False, connected=True)
-    # x contains count of 16 or 32 Bit instructions pairs
-    # x*6 is the count of Bytes saved by a reduction to 16 bit inst
-    improvement = get_improvement(pairs, lambda x: x*6)
 
-    if debug:
-        pairs = most_pairs(total, 10, equal=True)
-        for pair in pairs:
-            print(pair)
-        print()
+def print_debug_pairs(instructions):
+    pairs = most_pairs(instructions, 10, equal=True)
+    for pair in pairs:
+        print(pair)
+    print()
 
-        pairs = most_pairs(total, 10, equal=False)
-        for pair in pairs:
-            print(pair)
-        print()
+    pairs = most_pairs(instructions, 10, equal=False)
+    for pair in pairs:
+        print(pair)
+    print()
 
 
 def plot_individual_dynamic_stats(file, instructions, tp, path):
@@ -420,24 +380,8 @@ def plot_individual_dynamic_stats(file, instructions, tp, path):
 
 def print_individual_dynamic_improvement(file, instructions):
     stats = most_inst(instructions, modes.Mode.FULL, modes.SearchKey.MNEMONIC, 10000000)
-    # x contains count of 32 Bit (4 Byte) instructions
-    # x*2 is the count of Bytes saved by a reduction to 16 bit inst
-    improvement = get_improvement(stats, lambda x: x*2)
-    inst_count = len(instructions)
-    byte_count = get_byte_count(instructions)
-    print(file, 'contains', len(instructions), 'with', byte_count, 'bytes')
-    print('  Improvement by replacing all 32 Bit inst with 16 Bit inst: ' + str(improvement) + ' Byte  ==', round((1 - ((byte_count - improvement)/byte_count))*100), '%')
-
-    addrs = most_addr(instructions, 10000000)
-    
-    bound = 99
-    inst_count_80p = get_inst_rate(addrs, inst_count, bound)
-    print('  ', bound, '% time spend in ', inst_count_80p, ' instructions, equate to ', (inst_count_80p/inst_count)*100, '%')
-    bound = 90
-    while (inst_count_80p/inst_count)*100 > 50:
-        inst_count_80p = get_inst_rate(addrs, inst_count, bound)
-        print('  ', bound, '% time spend in ', inst_count_80p, ' instructions, equate to ', (inst_count_80p/inst_count)*100, '%')
-        bound -= 10
+    addr_counts = count_addr(instructions).values()
+    report_individual_dynamic_improvement(file, stats, len(instructions), get_byte_count(instructions), addr_counts)
 
     if debug:
         pairs = most_pairs(instructions, 10, equal=True)
@@ -451,20 +395,46 @@ def print_individual_dynamic_improvement(file, instructions):
         print()
 
 
-def print_total_dynamic_improvement(total):
-    stats = most_inst(total, modes.Mode.FULL, modes.SearchKey.MNEMONIC, 10000000000)
+def print_individual_histogram_improvement(file, hist):
+    'like `print_individual_dynamic_improvement` for a `histogram.Histogram`'
+    stats = hist.most_inst(modes.Mode.FULL, modes.SearchKey.MNEMONIC, 10000000)
+    report_individual_dynamic_improvement(file, stats, hist.inst_count, hist.byte_count, hist.addrs.values())
+
+    if debug:
+        pairs = hist.most_pairs(10, equal=True)
+        for pair in pairs:
+            print(pair)
+        print()
+
+        pairs = hist.most_pairs(10, equal=False)
+        for pair in pairs:
+            print(pair)
+        print()
+
+
+def report_individual_dynamic_improvement(file, stats, inst_count, byte_count, addr_counts):
     # x contains count of 32 Bit (4 Byte) instructions
     # x*2 is the count of Bytes saved by a reduction to 16 bit inst
     improvement = get_improvement(stats, lambda x: x*2)
-    total_byte_count = get_byte_count(total)
-    total_inst_count = len(total)
-    print('Total contains', len(total), 'with', total_byte_count, 'bytes')
-    print('  Improvement by replacing all 32 Bit inst with 16 Bit inst: ' + str(improvement) + ' Byte  ==', round((1 - ((total_byte_count - improvement)/total_byte_count))*100), '%')
-
-    addrs = most_addr(total, 10000000)
+    print(file, 'contains', inst_count, 'with', byte_count, 'bytes')
+    print('  Improvement by replacing all 32 Bit inst with 16 Bit inst: ' + str(improvement) + ' Byte  ==', round((1 - ((byte_count - improvement)/byte_count))*100), '%')
+    
+    # all bounds are looked up in one cumulative sum of the execution counts
+    curve = dict(coverage.get_curve(addr_counts, inst_count))
     bound = 99
-    inst_count_80p = get_inst_rate(addrs, total_inst_count, bound)
-    print('  Total ', bound, ' % time spend in ', inst_count_80p, ' instructions, equate to ', (inst_count_80p/total_inst_count)*100, '%')
+    inst_count_80p = curve[bound]
+    print('  ', bound, '% time spend in ', inst_count_80p, ' instructions, equate to ', (inst_count_80p/inst_count)*100, '%')
+    bound = 90
+    while (inst_count_80p/inst_count)*100 > 50:
+        inst_count_80p = curve[bound]
+        print('  ', bound, '% time spend in ', inst_count_80p, ' instructions, equate to ', (inst_count_80p/inst_count)*100, '%')
+        bound -= 10
+
+
+def print_total_dynamic_improvement(total):
+    stats = most_inst(total, modes.Mode.FULL, modes.SearchKey.MNEMONIC, 10000000000)
+    addr_counts = count_addr(total).values()
+    report_total_dynamic_improvement(stats, len(total), get_byte_count(total), addr_counts)
 
     pairs = most_pairs(total, 10, equal=False, connected=True)
     # x contains count of 16 or 32 Bit instructions pairs
@@ -473,12 +443,33 @@ def print_total_dynamic_improvement(total):
     # print('Max. improvement by replacing all 16 or 32 Bit instructions pairs with 16 Bit inst: ' + str(improvement) + ' Byte')
 
     if debug:
-        pairs = most_pairs(total, 10, equal=True)
+        print_debug_pairs(total)
+
+
+def print_total_histogram_improvement(total):
+    'like `print_total_dynamic_improvement` for a `histogram.Histogram`'
+    stats = total.most_inst(modes.Mode.FULL, modes.SearchKey.MNEMONIC, 10000000000)
+    report_total_dynamic_improvement(stats, total.inst_count, total.byte_count, total.addrs.values())
+
+    if debug:
+        pairs = total.most_pairs(10, equal=True)
         for pair in pairs:
             print(pair)
         print()
 
-        pairs = most_pairs(total, 10, equal=False)
+        pairs = total.most_pairs(10, equal=False)
         for pair in pairs:
             print(pair)
         print()
+
+
+def report_total_dynamic_improvement(stats, total_inst_count, total_byte_count, addr_counts):
+    # x contains count of 32 Bit (4 Byte) instructions
+    # x*2 is the count of Bytes saved by a reduction to 16 bit inst
+    improvement = get_improvement(stats, lambda x: x*2)
+    print('Total contains', total_inst_count, 'with', total_byte_count, 'bytes')
+    print('  Improvement by replacing all 32 Bit inst with 16 Bit inst: ' + str(improvement) + ' Byte  ==', round((1 - ((total_byte_count - improvement)/total_byte_count))*100), '%')
+
+    bound = 99
+    inst_count_80p = coverage.get_curve(addr_counts, total_inst_count, [bound])[0][1]
+    print('  Total ', bound, ' % time spend in ', inst_count_80p, ' instructions, equate to ', (inst_count_80p/total_inst_count)*100, '%')
@@ -0,0 +1,202 @@
+from functools import partial
+
+from tools import analysis, evaluator, modes, parse_utils
+from tools.analysis import add_chain, add_cnt, is_connected
+
+# Instructions kept at the start and end of a histogram to count the triplets across a merge
+WINDOW = 2
+
+
+class Histogram:
+    '''
+    Counts of a stream of instructions that can be merged with the counts of the following stream.
+
+    A histogram is fed one instruction after another and does not keep the instructions.
+    The queries feed the counts to the accumulators of `analysis`, so they return the same
+    results as the functions with the same name in `evaluator` for the list of all instructions fed.
+    The first and last `WINDOW` instructions are kept, so that `merge` can count the pairs 
+    and triplets that straddle the border between two histograms, e.g. of two chunks of a trace.
+    Likewise the first and the last run of equal mnemonics are kept open for `longest_chains`,
+    as they may continue in the neighbouring histogram. The chain distribution of
+    `evaluator.chain_distrib` is not tracked.
+    '''
+    inst_count: int = 0
+    byte_count: int = 0
+
+    def __init__(self):
+        self.inst_count = 0
+        self.byte_count = 0
+        # (size, key) -> count per search key
+        self.insts = {
+            modes.SearchKey.MNEMONIC: {},
+            modes.SearchKey.OPCODE: {},
+            modes.SearchKey.REGISTER: {}
+        }
+        self.addrs = {}
+        # (old mnemonic, new mnemonic, connected) -> count
+        self.pairs = {}
+        # (very old mnemonic, old mnemonic, new mnemonic, connected) -> count
+        self.triplets = {}
+        self.head = []
+        self.tail = []
+        # mnemonic -> longest chain, of the finished runs after the first one
+        self.chains = {}
+        # [mnemonic, length] of the first run once it is finished and of the last run
+        self.first_run = None
+        self.run = None
+
+    def add(self, inst):
+        size = inst.get_size()
+        self.inst_count += 1
+        self.byte_count += size
+        add_cnt(self.insts[modes.SearchKey.MNEMONIC], (size, inst.mnemonic))
+        add_cnt(self.insts[modes.SearchKey.OPCODE], (size, inst.opcode))
+        for reg in inst.regs:
+            add_cnt(self.insts[modes.SearchKey.REGISTER], (size, reg))
+        add_cnt(self.addrs, inst.address)
+        if self.run is not None and self.run[0] == inst.mnemonic:
+            self.run[1] += 1
+        else:
+            if self.run is not None:
+                self.finish_run(self.run)
+            self.run = [inst.mnemonic, 1]
+        
+        self.count_windows(self.tail, [inst])
+        if len(self.head) < WINDOW:
+            self.head.append(inst)
+        self.tail.append(inst)
+        if len(self.tail) > WINDOW:
+            self.tail.pop(0)
+
+    def add_all(self, instructions):
+        for inst in instructions:
+            self.add(inst)
+        return self
+
+    def count_windows(self, before, after):
+        'counts the pairs and triplets of `before` + `after` that contain instructions of both'
+        insts = before + after
+        border = len(before)
+        for i in range(max(0, border - 1), min(border, len(insts) - 1)):
+            old_inst, inst = insts[i:i+2]
+            add_cnt(self.pairs, (old_inst.mnemonic, inst.mnemonic, is_connected(old_inst, inst)))
+        for i in range(max(0, border - 2), min(border, len(insts) - 2)):
+            vold_inst, old_inst, inst = insts[i:i+3]
+            connected = is_connected(vold_inst, old_inst) and is_connected(old_inst, inst)
+            add_cnt(self.triplets, (vold_inst.mnemonic, old_inst.mnemonic, inst.mnemonic, connected))
+
+    def finish_run(self, run):
+        'records the `run` of equal mnemonics that is followed by another mnemonic'
+        if self.first_run is None:
+            self.first_run = run
+        else:
+            add_chain(self.chains, run[0], run[1])
+
+    def merge_chains(self, other: 'Histogram'):
+        'appends the runs of `other`, its first run continues the last run of this histogram'
+        if other.run is None:
+            return
+        if self.run is None:
+            self.chains = dict(other.chains)
+            self.first_run = None if other.first_run is None else list(other.first_run)
+            self.run = list(other.run)
+            return
+        
+        other_first = other.run if other.first_run is None else other.first_run
+        if self.run[0] == other_first[0]:
+            joined = [self.run[0], self.run[1] + other_first[1]]
+            if other.first_run is None:
+                self.run = joined
+                return
+            self.finish_run(joined)
+        else:
+            self.finish_run(self.run)
+            if other.first_run is not None:
+                self.finish_run(list(other.first_run))
+        for key, chain_len in other.chains.items():
+            add_chain(self.chains, key, chain_len)
+        self.run = list(other.run)
+
+    def merge(self, other: 'Histogram') -> 'Histogram':
+        'appends the counts of `other`, which has to follow the instructions of this histogram'
+        self.inst_count += other.inst_count
+        self.byte_count += other.byte_count
+        for search_key in self.insts:
+            for key, cnt in other.insts[search_key].items():
+                add_cnt(self.insts[search_key], key, cnt)
+        for key, cnt in other.addrs.items():
+            add_cnt(self.addrs, key, cnt)
+        
+        # windows across the border are located between the ones of both histograms
+        self.count_windows(self.tail, other.head)
+        for key, cnt in other.pairs.items():
+            add_cnt(self.pairs, key, cnt)
+        for key, cnt in other.triplets.items():
+            add_cnt(self.triplets, key, cnt)
+        self.merge_chains(other)
+        
+        self.head = (self.head + other.head)[:WINDOW]
+        self.tail = (self.tail + other.tail)[-WINDOW:]
+        return self
+
+    def most_inst(self, mode=modes.Mode.ALL, search_key=modes.SearchKey.MNEMONIC, threshold=10):
+        stat = analysis.MostInst(mode, search_key, threshold)
+        for (size, key), cnt in self.insts[search_key].items():
+            stat.add_count(size, key, cnt)
+        return stat.result()
+
+    def most_pairs(self, threshold=5, equal=False, connected=False):
+        stat = analysis.MostPairs(threshold, equal, connected)
+        for (old_mn, new_mn, is_conn), cnt in self.pairs.items():
+            stat.add_count(old_mn, new_mn, is_conn, cnt)
+        return stat.result()
+
+    def most_triplets(self, threshold=5, equal=False, connected=False):
+        stat = analysis.MostTriplets(threshold, equal, connected)
+        for (vold_mn, old_mn, new_mn, is_conn), cnt in self.triplets.items():
+            stat.add_count(vold_mn, old_mn, new_mn, is_conn, cnt)
+        return stat.result()
+
+    def longest_chains(self, threshold=2):
+        stat = analysis.LongestChains(threshold)
+        if self.first_run is not None:
+            add_chain(stat.chains, self.first_run[0], self.first_run[1])
+        for key, chain_len in self.chains.items():
+            add_chain(stat.chains, key, chain_len)
+        return stat.result()
+
+    def most_addr(self, threshold=10000):
+        return evaluator.sort_dict(self.addrs, threshold)
+
+
+def _range_histogram(parse_line, ignore, file_range) -> Histogram:
+    fqfn, start, end = file_range
+    instructions = parse_utils.iter_instructions(fqfn, parse_line, ignore, start, end)
+    return Histogram().add_all(instructions)
+
+
+def from_files(fqfns, parse_line, ignore, chunks=1, jobs=1) -> list[Histogram]:
+    '''
+    Returns the histograms of the traces `fqfns`.
+
+    Each trace is split at line borders into `chunks` byte ranges, the ranges of all traces
+    are parsed in a pool of `jobs` processes. The histograms of the ranges of a trace are
+    merged in the order of the ranges.
+    '''
+    ranges = [
+        (index, (fqfn, start, end))
+        for index, fqfn in enumerate(fqfns)
+        for start, end in parse_utils.split_file(fqfn, chunks)
+    ]
+    hists = parse_utils.map_files(partial(_range_histogram, parse_line, ignore), [rng for _, rng in ranges], jobs)
+    totals = [Histogram() for _ in fqfns]
+    for (index, _), hist in zip(ranges, hists):
+        totals[index].merge(hist)
+    return totals
+
+
+def from_file(fqfn, parse_line, ignore, jobs=1) -> Histogram:
+    '''
+    Returns the histogram of the trace `fqfn`, split into `jobs` byte ranges that are parsed in parallel.
+    '''
+    return from_files([fqfn], parse_line, ignore, jobs, jobs)[0]
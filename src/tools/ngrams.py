@@ -0,0 +1,117 @@
+import numpy as np
+
+from model import columnar, instruction_model
+from tools import ranking
+
+
+def get_reg_matrix(program: columnar.ColumnarProgram) -> np.ndarray:
+    'returns the register ids of each row padded with -1 to the longest register list'
+    offsets = program.reg_offsets
+    counts = np.diff(offsets)
+    width = int(counts.max()) if len(counts) > 0 else 0
+    result = np.full((len(program), max(width, 1)), -1, dtype=np.int32)
+    rows = np.repeat(np.arange(len(program)), counts)
+    cols = np.arange(offsets[-1] - offsets[0]) - np.repeat(offsets[:-1] - offsets[0], counts)
+    result[rows, cols] = program.reg_ids[offsets[0]:offsets[-1]]
+    return result
+
+
+def get_links(program: columnar.ColumnarProgram) -> np.ndarray:
+    '''
+    Returns for each row but the last if its destination is a param of the next row,
+    like `old_inst.get_dest() in inst.get_params()`.
+    '''
+    if len(program) < 2:
+        return np.zeros(0, dtype=np.bool_)
+    mnemonics = program.mnemonics.values
+    no_dest = np.array([mn in instruction_model.no_dest for mn in mnemonics], dtype=np.bool_)
+    all_params = np.array([mn in instruction_model.no_dest or mn in instruction_model.dup_compressed for mn in mnemonics], dtype=np.bool_)
+
+    regs = get_reg_matrix(program)
+    counts = np.diff(program.reg_offsets)
+    has_dest = ~no_dest[program.mnemonic_ids] & (counts >= 1)
+    # the first param is the first register, or the second one if the first is the destination
+    first_param = np.where(all_params[program.mnemonic_ids], 0, 1)
+    cols = np.arange(regs.shape[1])
+    is_param = (cols[None, :] >= first_param[:, None]) & (cols[None, :] < counts[:, None])
+
+    dest = regs[:-1, 0]
+    is_linked = (regs[1:] == dest[:, None]) & is_param[1:]
+    return has_dest[:-1] & is_linked.any(axis=1)
+
+
+def get_windows(program: columnar.ColumnarProgram, n: int) -> np.ndarray:
+    'returns the mnemonic ids of all overlapping windows of `n` rows, one window per row'
+    if len(program) < n:
+        return np.zeros((0, n), dtype=np.int32)
+    return np.lib.stride_tricks.sliding_window_view(program.mnemonic_ids, n)
+
+
+def equal_mask(program: columnar.ColumnarProgram, n: int) -> np.ndarray:
+    'returns for each window of `n` rows if all mnemonics are equal'
+    windows = get_windows(program, n)
+    return (windows == windows[:, :1]).all(axis=1)
+
+
+def connected_mask(program: columnar.ColumnarProgram, n: int) -> np.ndarray:
+    'returns for each window of `n` rows if the destination of each row is a param of the next'
+    links = get_links(program)
+    if len(program) < n:
+        return np.zeros(0, dtype=np.bool_)
+    if n < 2:
+        return np.ones(len(program) - n + 1, dtype=np.bool_)
+    return np.lib.stride_tricks.sliding_window_view(links, n - 1).all(axis=1)
+
+
+def most_ngrams(program: columnar.ColumnarProgram, n: int, threshold=5, mask=None, positions=None) -> list[tuple[str, int]]:
+    '''
+    Counts the overlapping windows of `n` mnemonics and returns the `threshold` most frequent.
+
+    Only the windows selected by `mask` are counted, keyed by the mnemonics at `positions`
+    (all by default) joined with '-'. Like `evaluator.sort_dict`, equal counts are ranked
+    by the first occurrence.
+    '''
+    if positions is None:
+        positions = list(range(n))
+    windows = get_windows(program, n)
+    if mask is not None:
+        windows = windows[mask]
+    windows = windows[:, positions]
+
+    vocab = max(len(program.mnemonics), 1)
+    if vocab ** len(positions) < 1 << 62:
+        # combine the ids of a window into one int key
+        keys = np.zeros(len(windows), dtype=np.int64)
+        for col in range(len(positions)):
+            keys = keys * vocab + windows[:, col]
+        _, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    else:
+        _, first, counts = np.unique(windows, axis=0, return_index=True, return_counts=True)
+
+    mnemonics = program.mnemonics.values
+    return [
+        ('-'.join(mnemonics[mid] for mid in windows[first[i]]), int(counts[i]))
+        for i in ranking.top_k_indices(counts, first, threshold)
+    ]
+
+
+def most_pairs(program: columnar.ColumnarProgram, threshold=5, equal=False, connected=False) -> list[tuple[str, int]]:
+    'like `evaluator.most_pairs`'
+    mask = None
+    if not equal and not connected:
+        mask = equal_mask(program, 2) | connected_mask(program, 2)
+    positions = [0] if equal else None
+    return most_ngrams(program, 2, threshold, mask, positions)
+
+
+def most_triplets(program: columnar.ColumnarProgram, threshold=5, equal=False, connected=False) -> list[tuple[str, int]]:
+    'like `evaluator.most_triplets`'
+    mask = None
+    if equal or connected:
+        mask = np.zeros(max(len(program) - 2, 0), dtype=np.bool_)
+        if equal:
+            mask |= equal_mask(program, 3)
+        if connected:
+            mask |= connected_mask(program, 3)
+    positions = [1] if equal else None
+    return most_ngrams(program, 3, threshold, mask, positions)
@@ -1,4 +1,9 @@
-from model import instruction_model, program
+import codecs
+import os
+import string
+from concurrent.futures import ProcessPoolExecutor
+
+from model import columnar, instruction_model, program
 
 ignore_underscore = True
 fuctions_to_ignore = [
@@ -6,6 +11,9 @@ fuctions_to_ignore = [
     'stdio_exit_handler', 'cleanup_stdio', 'global_stdio_init.part.0'
 ]
 
+# Bytes read from a source file at once, bounds the memory used while streaming
+CHUNK_SIZE = 1 << 20
+
 
 def filter_functions(source_line, last_function_is_ignored) -> bool:
     elems = source_line.split(' ')
@@ -22,54 +30,215 @@ def filter_functions(source_line, last_function_is_ignored) -> bool:
     return last_function_is_ignored
 
 
+def split_objdump_tokens(source_line: str) -> list[str]:
+    'returns the tokens of a line of llvm-objdump output, missing opcode bytes are a `~` placeholder'
+    return source_line.strip() \
+        .replace('    ', ' ~ ') \
+        .replace('\t', ' ') \
+        .replace('  ', ' ') \
+        .replace('  ', ' ') \
+        .replace('  ', ' ') \
+        .replace(',', '') \
+        .replace(':', '') \
+        .replace(')', '') \
+        .replace('{', '') \
+        .replace('}', '') \
+        .replace('(', ' ') \
+        .split(' ')
+
+
+def split_objdump_line(source_line: str):
+    '''
+    Splits a line of llvm-objdump output into its address, opcode, mnemonic and params.
+
+    Returns `None` for lines that are no instruction. The line is normalized by chained
+    `str.replace` calls: runs of 4 spaces pad missing opcode bytes and become a `~`
+    placeholder, so the mnemonic is found at a fixed position. A `str.translate` table
+    with a single `split` yields the same tokens but is slower, `benchmark.py objdump`
+    compares both.
+    '''
+    if source_line[0:1] == ' ' or source_line[0:1] in string.hexdigits:
+        elems = split_objdump_tokens(source_line)
+        elen = len(elems)
+        if elen >= 6:
+            mn_index = 5
+            if elen > 8 and elems[8][0:2] == 'k.':
+                mn_index = 8
+
+            opcode = elems[1]
+            oplen = len(opcode)
+            if oplen >= 4:
+                mn_index = 4
+                if oplen == 8:
+                    mn_index = 3
+            else:
+                op_elems = elems[1:mn_index]
+                op_elems.reverse()
+                opcode = ''.join(op_elems).replace('~', '')
+
+            return elems[0], opcode, elems[mn_index], elems[(mn_index+1):]
+    return None
+
+
+def split_spike_line(source_line: str) -> list[str]:
+    'returns the address, opcode, mnemonic and params of a line of spike trace'
+    return source_line[10:].strip() \
+        .replace(')', '') \
+        .replace('(', ' ') \
+        .replace('\t', ' ') \
+        .replace(' - ', '-') \
+        .replace(' + ', '+') \
+        .replace('  ', ' ') \
+        .replace('  ', ' ') \
+        .replace('  ', ' ') \
+        .replace(',', '') \
+        .replace(':', '') \
+        .split(' ')
+
+
+def decode_spike_line(source_line: str):
+    '''
+    Splits a line of spike trace into its address, opcode, mnemonic and params.
+
+    Returns `None` for lines that are no instruction. The line is still tokenized by
+    the replace chain of `split_spike_line`, a `str.translate` table or a compiled
+    pattern yield the same tokens but are slower (see `benchmark.py spike`). The
+    speedup of the spike parsing comes from `Instruction.append_params`, which
+    resolves the params in bulk.
+    '''
+    if source_line[0:12] == 'core   0: 0x':
+        elems = split_spike_line(source_line)
+        if len(elems) >= 3:
+            return elems[0], elems[1], elems[2], elems[3:]
+    return None
+
+
+def iter_lines(fqfn, chunk_size=CHUNK_SIZE, start=0, end=None):
+    '''
+    Yields the lines of `fqfn` without the line terminator.
+
+    The file is read in chunks of `chunk_size` bytes, so only one chunk and the 
+    line currently processed are held in memory, independent of the file size.
+    The yielded lines are the same as the ones of `file.read().split('\\n')`,
+    including the (possibly empty) remainder after the last line break.
+    With `start` and `end` only the lines of this byte range are yielded, 
+    both have to be at line borders (see `split_file`).
+    '''
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    rest = ''
+    with open(fqfn, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if end is None or end > size:
+            end = size
+        file.seek(start)
+        remaining = end - start
+        while True:
+            chunk = file.read(max(0, min(chunk_size, remaining)))
+            remaining -= len(chunk)
+            text = rest + decoder.decode(chunk, final=not chunk)
+            if '\r' in text:
+                text = text.replace('\r\n', '\n')
+            lines = text.split('\n')
+            rest = lines.pop()
+            yield from lines
+            if not chunk:
+                break
+    if end == size:
+        yield rest
+
+
+def split_file(fqfn, parts) -> list[tuple[int, int]]:
+    '''
+    Splits `fqfn` into up to `parts` byte ranges of similar size that start and end at line borders.
+    '''
+    size = os.path.getsize(fqfn)
+    borders = [0]
+    with open(fqfn, 'rb') as file:
+        for i in range(1, parts):
+            pos = max(size * i // parts, borders[-1] + 1)
+            if pos >= size:
+                break
+            # the range ends after the line break at or behind pos - 1
+            file.seek(pos - 1)
+            file.readline()
+            borders.append(min(file.tell(), size))
+    borders.append(size)
+    return [
+        (start, end)
+        for start, end in zip(borders, borders[1:])
+        if end > start
+    ] or [(0, size)]
+
+
+def iter_instructions(fqfn, parse_line, ignore, start=0, end=None):
+    '''
+    Yields the instructions parsed by `parse_line` one after another while streaming `fqfn`.
+    '''
+    last_function_is_ignored = False
+    for source_line in iter_lines(fqfn, start=start, end=end):
+        filered = filter_functions(source_line, last_function_is_ignored)
+        last_function_is_ignored = filered
+        if not filered:
+            # print("Parsing line: ", source_line.strip())
+            inst = parse_line(source_line, ignore)
+            if inst != None:
+                yield inst
+
+
 def parse_file(fqfn, parse_line, ignore) -> program.Program:
-    instructions = []
-    with open(fqfn, 'r', errors='replace') as file:
-            lines = file.read().split('\n')
-            last_function_is_ignored = False
-            for source_line in lines:
-                filered = filter_functions(source_line, last_function_is_ignored)
-                last_function_is_ignored = filered
-                if not filered:
-                    # print("Parsing line: ", source_line.strip())
-                    inst = parse_line(source_line, ignore)
-                    if inst != None:
-                        instructions.append(inst)
-            
+    instructions = list(iter_instructions(fqfn, parse_line, ignore))
+    return program.Program(instructions)
+
+
+def parse_columnar(fqfn, parse_line, ignore) -> program.Program:
+    '''
+    Like `parse_file`, but the instructions are stored in a `columnar.ColumnarProgram`.
+    '''
+    instructions = columnar.ColumnarProgram.from_instructions(iter_instructions(fqfn, parse_line, ignore))
     return program.Program(instructions)
 
 
 def parse_address_cnt(fqfn, addr_inst_map, addr_getter):
     op_inst_cnt_map = {}
-    with open(fqfn, 'r', errors='replace') as file:
-            lines = file.read().split('\n')
-            for source_line in lines:
-                inst_addr = addr_getter(source_line)
-                if inst_addr & 0x80000000 == 0:
-                    if inst_addr in addr_inst_map:
-                        cnt = 1
-                        if inst_addr in op_inst_cnt_map:
-                            cnt += op_inst_cnt_map[inst_addr][1]
-                            
-                        op_inst_cnt_map[inst_addr] = (addr_inst_map[inst_addr], cnt)
+    for source_line in iter_lines(fqfn):
+        inst_addr = addr_getter(source_line)
+        if inst_addr & 0x80000000 == 0:
+            if inst_addr in addr_inst_map:
+                cnt = 1
+                if inst_addr in op_inst_cnt_map:
+                    cnt += op_inst_cnt_map[inst_addr][1]
+                    
+                op_inst_cnt_map[inst_addr] = (addr_inst_map[inst_addr], cnt)
             
     return op_inst_cnt_map
 
 def parse_val_cnt(fqfn, val_getter, ignore, static_file, count):
     val = 0
-    with open(fqfn, 'r', errors='replace') as file:
-            lines = file.read().split('\n')
-            if static_file:
-                last_function_is_ignored = False
-                for source_line in lines:
-                    filered = filter_functions(source_line, last_function_is_ignored)
-                    last_function_is_ignored = filered
-                    if not filered:
-                        val += val_getter(source_line, ignore, count)
-            else:
-                val = sum([
-                    val_getter(source_line, ignore, count)
-                    for source_line in lines
-                ])
+    if static_file:
+        last_function_is_ignored = False
+        for source_line in iter_lines(fqfn):
+            filered = filter_functions(source_line, last_function_is_ignored)
+            last_function_is_ignored = filered
+            if not filered:
+                val += val_getter(source_line, ignore, count)
+    else:
+        val = sum(
+            val_getter(source_line, ignore, count)
+            for source_line in iter_lines(fqfn)
+        )
             
     return val
+
+
+def map_files(func, items, jobs=1) -> list:
+    '''
+    Applies `func` to every item, in a pool of `jobs` processes if `jobs` is greater than one.
+
+    The results keep the order of `items`, so they can be merged the same way as the
+    results of a sequential run.
+    '''
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(items))) as pool:
+        return list(pool.map(func, items))
@@ -0,0 +1,48 @@
+import heapq
+
+import numpy as np
+
+# Threshold from which `sort_dict` sorts all items at once instead of selecting them with a heap,
+# callers pass larger ones like 10000000 to get all items
+SORT_THRESHOLD = 100000
+
+
+def top_k(items, k, key=None, largest=True) -> list:
+    '''
+    Returns `sorted(items, key=key, reverse=largest)[:k]`, equal items keep their order.
+
+    Selects with a heap of `k` items instead of sorting all items.
+    '''
+    if k < 0:
+        return sorted(items, key=key, reverse=largest)[:k]
+    if largest:
+        return heapq.nlargest(k, items, key=key)
+    return heapq.nsmallest(k, items, key=key)
+
+
+def top_k_indices(counts: np.ndarray, order: np.ndarray, k: int) -> np.ndarray:
+    '''
+    Returns the indices of the `k` largest `counts`, equal counts ranked by the smaller `order`.
+
+    Only the counts that can be in the top `k` are sorted.
+    '''
+    if k <= 0 or len(counts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(counts):
+        kth = counts[np.argpartition(counts, len(counts) - k)[len(counts) - k]]
+        candidates = np.flatnonzero(counts >= kth)
+    else:
+        candidates = np.arange(len(counts))
+    ranked = candidates[np.lexsort((order[candidates], -counts[candidates]))]
+    return ranked[:k]
+
+
+def sort_dict(result: dict, threshold: int) -> list:
+    '''
+    Returns the `threshold` items of `result` with the largest values, equal values in insertion order.
+
+    From `SORT_THRESHOLD` on all items are sorted at once, as the callers read most of them.
+    '''
+    if threshold >= SORT_THRESHOLD:
+        return sorted(result.items(), key=lambda x:x[1], reverse=True)[:threshold]
+    return top_k(result.items(), threshold, key=lambda x:x[1])
@@ -0,0 +1,224 @@
+import heapq
+import time
+
+# Nodes of the branch and bound search between two checks of the time limit
+CHECK_INTERVAL = 1000
+
+
+def get_free_improvement(sites: list[tuple[list[int], int]], covered: set[int]) -> tuple[int, set[int]]:
+    '''
+    Returns the improvement of the `sites` that use no `covered` instruction and the
+    instructions they use. The sites are taken in order, so each instruction is used at most once.
+
+    A site is the list of positions of the instructions of one match and its improvement.
+    '''
+    improvement = 0
+    used = set()
+    for positions, site_improvement in sites:
+        if covered.isdisjoint(positions) and used.isdisjoint(positions):
+            improvement += site_improvement
+            used.update(positions)
+    return improvement, used
+
+
+def greedy(candidates: list[tuple[object, list]], budgets: dict) -> list[tuple[int, int]]:
+    '''
+    Selects candidates one after another, each with the largest improvement on the instructions
+    not used by the candidates selected before, until the budget of each group is used up.
+
+    `candidates` are tuples of group and sites, `budgets` the count of candidates per group.
+    Returns the indices of the selected candidates in the order of selection with their
+    remaining improvement. The improvement of a candidate only decreases, so the candidates
+    are kept in a priority queue and only the ones that share an instruction with a selected
+    candidate are scored again when they reach the top.
+    '''
+    by_position: dict[int, list[int]] = {}
+    queue = []
+    for index, (_, sites) in enumerate(candidates):
+        improvement, _ = get_free_improvement(sites, set())
+        if improvement > 0:
+            heapq.heappush(queue, (-improvement, index))
+            for positions, _ in sites:
+                for position in positions:
+                    by_position.setdefault(position, []).append(index)
+
+    left = dict(budgets)
+    covered = set()
+    stale = set()
+    result = []
+    while queue and any(count > 0 for count in left.values()):
+        _, index = heapq.heappop(queue)
+        group, sites = candidates[index]
+        if left.get(group, 0) <= 0:
+            continue
+        if index in stale:
+            stale.discard(index)
+            improvement, _ = get_free_improvement(sites, covered)
+            if improvement > 0:
+                heapq.heappush(queue, (-improvement, index))
+            continue
+        improvement, used = get_free_improvement(sites, covered)
+        result.append((index, improvement))
+        left[group] -= 1
+        covered.update(used)
+        for position in used:
+            stale.update(by_position[position])
+    return result
+
+
+def get_upper_bound(sites: list[tuple[list[int], int]]) -> int:
+    'returns the improvement of all `sites`, no `get_free_improvement` of them is larger'
+    return sum(site_improvement for _, site_improvement in sites)
+
+
+def get_order(candidates: list[tuple[object, list]]) -> list[int]:
+    'returns the indices of the improving candidates by descending `get_upper_bound`'
+    upper = [get_upper_bound(sites) for _, sites in candidates]
+    order = sorted(range(len(candidates)), key=lambda index: -upper[index])
+    return [index for index in order if upper[index] > 0]
+
+
+def get_improvements(candidates: list[tuple[object, list]], picks) -> list[tuple[int, int]]:
+    '''
+    Returns the improvement of each of the `picks` when the picked candidates take their
+    instructions in the order of `get_order`, the value of a set of picks used by `branch_and_bound`.
+    '''
+    picked = set(picks)
+    covered = set()
+    result = []
+    for index in get_order(candidates):
+        if index in picked:
+            improvement, used = get_free_improvement(candidates[index][1], covered)
+            covered.update(used)
+            result.append((index, improvement))
+    return result
+
+
+def get_greedy_improvements(candidates: list[tuple[object, list]], picks) -> list[tuple[int, int]]:
+    '''
+    Returns the improvement of each of the `picks` when the picked candidates take their
+    instructions in the order in which `greedy` selects them, so the picks of `greedy` keep
+    the improvement it reported.
+    '''
+    picked = sorted(set(picks))
+    subset = [(0, candidates[index][1]) for index in picked]
+    return [
+        (picked[pos], improvement)
+        for pos, improvement in greedy(subset, {0: len(picked)})
+    ]
+
+
+def get_best_improvements(candidates: list[tuple[object, list]], picks) -> tuple[list[tuple[int, int]], int]:
+    '''
+    Returns the improvement of each of the `picks` and their total, of `get_improvements` or
+    `get_greedy_improvements`, whichever assigns the instructions with the larger total.
+    '''
+    result = None
+    total = -1
+    for improvements in (get_improvements(candidates, picks), get_greedy_improvements(candidates, picks)):
+        value = sum(improvement for _, improvement in improvements)
+        if value > total:
+            result = improvements
+            total = value
+    return result, total
+
+
+def branch_and_bound(candidates: list[tuple[object, list]], budgets: dict, time_limit: float, incumbent=None, on_improve=None) -> tuple[list[tuple[int, int]], int, bool]:
+    '''
+    Searches a set of candidates with a larger total improvement than the `incumbent` picks
+    that keeps the budget of each group, like `greedy`.
+
+    The search scores the picked candidates by letting them take their instructions in the order
+    of `get_order`. The candidates are decided in that order, a branch is cut when its improvement
+    plus the largest upper bounds of the remaining candidates that fit into the budgets cannot beat
+    the best set found. Each set visited and the `incumbent` are scored like `get_best_improvements`,
+    so the result is never worse than the incumbent, e.g. the picks of `greedy` with the improvement
+    it reported. The search stops after `time_limit` seconds with the best set found so far,
+    `on_improve(value, seconds)` is called for every better set.
+
+    Returns the picks as `get_best_improvements`, their total improvement and if the search finished.
+    A finished search found no better set in the claim order of `get_order`, this does not prove
+    that no other assignment of the instructions is better.
+    '''
+    start = time.perf_counter()
+    order = get_order(candidates)
+    upper = [get_upper_bound(candidates[index][1]) for index in order]
+    groups = [candidates[index][0] for index in order]
+
+    # per group the positions in the order and the prefix sums of their upper bounds
+    members: dict[object, list[int]] = {group: [] for group in budgets}
+    for pos, group in enumerate(groups):
+        if group in members:
+            members[group].append(pos)
+    prefix = {}
+    for group, positions in members.items():
+        prefix[group] = [0]
+        for pos in positions:
+            prefix[group].append(prefix[group][-1] + upper[pos])
+    # per position of the order and group the index of the first member at or after it
+    next_member = []
+    counters = {group: 0 for group in members}
+    for pos in range(len(order) + 1):
+        for group, positions in members.items():
+            while counters[group] < len(positions) and positions[counters[group]] < pos:
+                counters[group] += 1
+        next_member.append(dict(counters))
+
+    best_value = 0
+    best_picks = []
+
+    def offer(scored: list[tuple[int, int]], value: int):
+        nonlocal best_value, best_picks
+        if value > best_value:
+            best_value = value
+            # picks without free instructions only use up the budget
+            best_picks = [pick for pick in scored if pick[1] > 0]
+            if on_improve is not None:
+                on_improve(best_value, time.perf_counter() - start)
+
+    if incumbent is not None:
+        offer(*get_best_improvements(candidates, incumbent))
+
+    left = {group: budgets[group] for group in members}
+    covered = set()
+    picks = []
+    nodes = 0
+    timed_out = False
+
+    def bound(pos: int) -> int:
+        result = 0
+        for group, count in left.items():
+            first = next_member[pos][group]
+            last = min(first + count, len(members[group]))
+            result += prefix[group][last] - prefix[group][first]
+        return result
+
+    def search(pos: int, value: int):
+        nonlocal nodes, timed_out
+        # `picks` are scored like `get_improvements`, the same set may score better like `greedy`
+        offer(picks, value)
+        if len(picks) > 1:
+            scored = get_greedy_improvements(candidates, [index for index, _ in picks])
+            offer(scored, sum(improvement for _, improvement in scored))
+        for next_pos in range(pos, len(order)):
+            nodes += 1
+            if nodes % CHECK_INTERVAL == 0 and time.perf_counter() - start > time_limit:
+                timed_out = True
+            if timed_out or value + bound(next_pos) <= best_value:
+                return
+            group = groups[next_pos]
+            if left.get(group, 0) <= 0:
+                continue
+            index = order[next_pos]
+            # a candidate without free instructions in this order may still improve the set like `greedy`
+            improvement, used = get_free_improvement(candidates[index][1], covered)
+            left[group] -= 1
+            covered.update(used)
+            picks.append((index, improvement))
+            search(next_pos + 1, value + improvement)
+            picks.pop()
+            covered.difference_update(used)
+            left[group] += 1
+
+    search(0, 0)
+    return best_picks, best_value, not timed_out
@@ -0,0 +1,137 @@
+import mmap
+import os
+
+import numpy as np
+
+# An ETISS trace line starts with the address: 0x<16 hex digits>:
+ETISS_ADDR_LEN = 18
+# Bytes of the mapped trace converted to arrays at once
+WINDOW_SIZE = 64 << 20
+
+_NEWLINE = ord('\n')
+_NOT_HEX = 0xFF
+_HEX_VALUES = np.full(256, _NOT_HEX, dtype=np.uint8)
+for _i, _c in enumerate('0123456789abcdef'):
+    _HEX_VALUES[ord(_c)] = _i
+    _HEX_VALUES[ord(_c.upper())] = _i
+
+
+def _count_window(window: np.ndarray, addrs: np.ndarray, counts: np.ndarray):
+    starts = np.flatnonzero(window == _NEWLINE) + 1
+    starts = np.concatenate((np.zeros(1, dtype=starts.dtype), starts))
+    starts = starts[starts + ETISS_ADDR_LEN <= len(window)]
+    starts = starts[(window[starts] == ord('0')) & (window[starts + 1] == ord('x'))]
+    
+    # the hex digits of each address as rows of a strided view, gathered as bytes
+    fields = np.lib.stride_tricks.sliding_window_view(window, ETISS_ADDR_LEN - 2)
+    digits = _HEX_VALUES[fields[starts + 2]]
+    valid = np.all(digits != _NOT_HEX, axis=1)
+    
+    # the digits stay bytes, only the values of the lines are widened
+    values = np.zeros(len(digits), dtype=np.uint64)
+    for col in range(digits.shape[1]):
+        values <<= np.uint64(4)
+        values |= digits[:, col]
+    values = values[valid]
+    values = values[(values & np.uint64(0x80000000)) == 0]
+    
+    pos = np.searchsorted(addrs, values)
+    pos[pos == len(addrs)] = 0
+    pos = pos[addrs[pos] == values]
+    counts += np.bincount(pos, minlength=len(addrs))
+
+
+def count_etiss_addrs(fqfn, addrs: np.ndarray, window_size: int=WINDOW_SIZE) -> np.ndarray:
+    '''
+    Counts how often each address of `addrs` is executed in the ETISS trace `fqfn`.
+
+    The trace is memory mapped and scanned as bytes: only the `0x...` address
+    prefix of each line is converted, the rest of the line is never decoded.
+    Like `parse_utils.parse_address_cnt` addresses with bit 31 set are skipped.
+
+    Parameters:
+    - fqfn: path of the ETISS trace.
+    - addrs: sorted array of unique addresses (uint64) to count.
+    - window_size: bytes of the mapping processed at once.
+
+    Returns
+    - `np.ndarray`: execution count for each entry of `addrs`.
+    '''
+    addrs = np.asarray(addrs, dtype=np.uint64)
+    counts = np.zeros(len(addrs), dtype=np.int64)
+    size = os.path.getsize(fqfn)
+    if size == 0 or len(addrs) == 0:
+        return counts
+    
+    with open(fqfn, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = np.frombuffer(mapped, dtype=np.uint8)
+            try:
+                start = 0
+                while start < size:
+                    end = min(start + window_size, size)
+                    if end < size:
+                        # only process complete lines
+                        line_end = mapped.rfind(b'\n', start, end)
+                        if line_end < 0:
+                            line_end = mapped.find(b'\n', end)
+                        end = size if line_end < 0 else line_end + 1
+                    _count_window(data[start:end], addrs, counts)
+                    start = end
+            finally:
+                # the mapping cannot be closed while numpy still references it
+                del data
+    return counts
+
+
+def get_address_cnt(addrs: np.ndarray, counts: np.ndarray, addr_inst_map):
+    'returns the map of the executed addresses to the tuple of instruction and execution count'
+    return {
+        int(addrs[i]): (addr_inst_map[int(addrs[i])], int(counts[i]))
+        for i in np.flatnonzero(counts)
+    }
+
+
+def get_addrs(addr_inst_map) -> np.ndarray:
+    'returns the sorted address array of `addr_inst_map` for `count_etiss_addrs`'
+    return np.array(sorted(addr_inst_map.keys()), dtype=np.uint64)
+
+
+def get_count_arrays(addr_cnt_map) -> tuple[np.ndarray, np.ndarray]:
+    'returns the sorted addresses of a map of `get_address_cnt` and their execution counts'
+    addrs = np.array(sorted(addr_cnt_map.keys()), dtype=np.uint64)
+    counts = np.array([addr_cnt_map[int(addr)][1] for addr in addrs], dtype=np.int64)
+    return addrs, counts
+
+
+def get_inst_addrs(instructions) -> np.ndarray:
+    'returns the addresses of `instructions` in their order'
+    return np.fromiter((inst.get_address() for inst in instructions), dtype=np.uint64, count=len(instructions))
+
+
+def join_counts(inst_addrs: np.ndarray, addrs: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    '''
+    Returns the execution count of each address of `inst_addrs`, 0 if it was never executed.
+
+    The addresses of the instructions are looked up in the sorted `addrs` of the trace all
+    at once, so the result is parallel to the instructions and can be indexed by position.
+    '''
+    result = np.zeros(len(inst_addrs), dtype=np.int64)
+    if len(addrs) == 0:
+        return result
+    pos = np.searchsorted(addrs, inst_addrs)
+    pos[pos == len(addrs)] = 0
+    found = addrs[pos] == inst_addrs
+    result[found] = counts[pos[found]]
+    return result
+
+
+def parse_etiss_address_cnt(fqfn, addr_inst_map):
+    '''
+    Drop in replacement of `parse_utils.parse_address_cnt` with `dynamic.get_etiss_addr`.
+
+    Returns a map of the executed address to the tuple of instruction and execution count.
+    '''
+    addrs = get_addrs(addr_inst_map)
+    counts = count_etiss_addrs(fqfn, addrs)
+    return get_address_cnt(addrs, counts, addr_inst_map)